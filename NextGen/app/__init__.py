@@ -20,4 +20,14 @@ def create_app():
     app.register_blueprint(auto_order_bp)
     app.register_blueprint(analytics_bp)
 
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Background jobs start lazily inside each worker (after gunicorn forks)
+    if app.config["SCHEDULER_ENABLED"]:
+        from app.scheduler import start_scheduler
+        from app.reorder import start_reorder_listener
+        app.before_request(start_scheduler)
+        app.before_request(start_reorder_listener)
+
     return app
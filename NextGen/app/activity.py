@@ -0,0 +1,169 @@
+# NextGen/app/activity.py
+# Recent-activity feed. log_activity() only enqueues; a background thread
+# flushes the queue with one multi-row INSERT, so write paths pay no extra
+# round trips. The table comes from migrations (no DDL at request time)
+# and the prune job caps it at Config.ACTIVITY_KEEP_ROWS.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import psycopg2.extras
+from app.config import Config
+from app.db import connect
+from app.scheduler import register_job
+
+log = logging.getLogger(__name__)
+
+FLUSH_BATCH = 500        # max rows per INSERT
+FLUSH_WAIT = 2.0         # seconds to collect more rows after the first before flushing
+
+_queue = queue.Queue(maxsize=10000)
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+# ----------------------------
+# Write side
+# ----------------------------
+def log_activity(message):
+    """Queue an activity row. Never blocks or raises — logging must not break the main flow."""
+    _ensure_flusher()
+    try:
+        _queue.put_nowait((message, datetime.now()))
+    except queue.Full:
+        log.warning("activity queue full, dropping: %s", message)
+
+
+def _drain(first=None):
+    rows = [first] if first is not None else []
+    while len(rows) < FLUSH_BATCH:
+        try:
+            rows.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+
+def _collect(first):
+    """`first` plus whatever arrives within FLUSH_WAIT, up to FLUSH_BATCH rows."""
+    rows = [first]
+    deadline = time.monotonic() + FLUSH_WAIT
+    while len(rows) < FLUSH_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            rows.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return rows
+
+
+def _insert(conn, rows):
+    cur = conn.cursor()
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO recent_activities (activity_text, created_at) VALUES %s;",
+        rows,
+        page_size=FLUSH_BATCH
+    )
+    conn.commit()
+    cur.close()
+
+
+def _flush_forever():
+    conn = None
+    while True:
+        rows = _collect(_queue.get())
+        try:
+            if conn is None or conn.closed:
+                conn = connect()
+            _insert(conn, rows)
+        except Exception:
+            log.exception("activity flush failed, %d rows lost", len(rows))
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+
+
+def flush_activities():
+    """Synchronously write whatever is queued (used at exit and by the CLI)."""
+    rows = _drain()
+    if not rows:
+        return 0
+    written = 0
+    conn = connect()
+    try:
+        while rows:
+            _insert(conn, rows)
+            written += len(rows)
+            rows = _drain()
+    finally:
+        conn.close()
+    return written
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_forever, name="activity-flusher", daemon=True).start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_activities()
+    except Exception:
+        pass
+
+
+# ----------------------------
+# Read side
+# ----------------------------
+def fetch_recent_activities(conn, limit=10):
+    """Latest `limit` rows, served by idx_recent_activities_created_at."""
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute("""
+        SELECT activity_text, created_at
+        FROM recent_activities
+        ORDER BY created_at DESC
+        LIMIT %s;
+    """, (limit,))
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def prune_activities(conn, keep=None):
+    """Delete everything but the newest `keep` rows."""
+    keep = Config.ACTIVITY_KEEP_ROWS if keep is None else keep
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM recent_activities
+        WHERE id < (
+            SELECT id FROM recent_activities
+            ORDER BY id DESC
+            OFFSET %s LIMIT 1
+        );
+    """, (max(keep, 1) - 1,))
+    deleted = cur.rowcount
+    cur.close()
+    return deleted
+
+
+register_job("prune_activities", 3600, prune_activities)
@@ -0,0 +1,84 @@
+# NextGen/app/alerts.py
+# Expiry alert maintenance — a scheduled diff, not a rebuild.
+#
+# An expiry alert is keyed by (product_id, 'Expiry', expiry_date)
+# (unique index, migration 14). Each run:
+#
+#   upsert   products expiring in the next EXPIRY_WINDOW_DAYS that have no
+#            alert for that date yet; a Retired alert whose product is back
+#            in the window is re-activated. Existing rows are only written
+#            when their message changed, so "Resolved" survives.
+#   retire   open alerts whose product no longer expires on that date or
+#            has left the window (expired, restocked with a new date,
+#            deleted) become 'Retired'.
+#   prune    Retired alerts for dates long past are deleted.
+#
+# Unchanged alerts are never touched, and the alerts page only reads.
+
+import logging
+from app.config import Config
+from app.kpi import invalidate_kpis
+from app.scheduler import register_job
+
+log = logging.getLogger(__name__)
+
+EXPIRY_WINDOW_DAYS = 30
+RETIRED_KEEP_DAYS = 30
+
+
+def refresh_expiry_alerts(conn):
+    """Bring expiry alerts in line with products. Returns (upserted, retired)."""
+    cur = conn.cursor()
+
+    cur.execute("""
+        INSERT INTO alerts (product_id, alert_type, message, status, sent_date, expiry_date)
+        SELECT
+            p.id,
+            'Expiry',
+            CONCAT(p.name, ' is expiring on ', p.expiry_date),
+            'Active',
+            NOW(),
+            p.expiry_date
+        FROM products p
+        WHERE p.expiry_date > CURRENT_DATE
+          AND p.expiry_date <= CURRENT_DATE + %(window)s
+        ON CONFLICT (product_id, alert_type, expiry_date) DO UPDATE
+        SET message = EXCLUDED.message,
+            status = CASE WHEN alerts.status = 'Retired' THEN 'Active' ELSE alerts.status END,
+            sent_date = CASE WHEN alerts.status = 'Retired' THEN NOW() ELSE alerts.sent_date END
+        WHERE alerts.status = 'Retired'
+           OR alerts.message IS DISTINCT FROM EXCLUDED.message;
+    """, {"window": EXPIRY_WINDOW_DAYS})
+    upserted = cur.rowcount
+
+    cur.execute("""
+        UPDATE alerts a
+        SET status = 'Retired'
+        WHERE a.alert_type = 'Expiry'
+          AND a.status <> 'Retired'
+          AND NOT EXISTS (
+              SELECT 1 FROM products p
+              WHERE p.id = a.product_id
+                AND p.expiry_date = a.expiry_date
+                AND p.expiry_date > CURRENT_DATE
+                AND p.expiry_date <= CURRENT_DATE + %(window)s
+          );
+    """, {"window": EXPIRY_WINDOW_DAYS})
+    retired = cur.rowcount
+
+    cur.execute("""
+        DELETE FROM alerts
+        WHERE alert_type = 'Expiry'
+          AND status = 'Retired'
+          AND (expiry_date IS NULL OR expiry_date < CURRENT_DATE - %s);
+    """, (RETIRED_KEEP_DAYS,))
+
+    if upserted or retired:
+        invalidate_kpis(conn)
+        log.info("expiry alerts: %d upserted, %d retired", upserted, retired)
+
+    cur.close()
+    return upserted, retired
+
+
+register_job("expiry_alerts", Config.EXPIRY_ALERT_INTERVAL, refresh_expiry_alerts)
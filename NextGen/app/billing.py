@@ -0,0 +1,246 @@
+# NextGen/app/billing.py
+# Checkout core — a constant number of round trips per bill, whatever
+# the number of cart lines:
+#   1. lock + check stock       (product_stock, see app/stock.py)
+#   2. lock every batch row     (only if the cart references batches)
+#   3. allocate the bill number (one upsert on bill_counters)
+#      + insert the bill header (one INSERT INTO bills)
+#      + all sale lines         (one multi-row INSERT ... RETURNING)
+#   4. append stock movements   (one multi-row INSERT, see app/stock.py)
+#   5. decrement batches        (only if the cart references batches)
+# Locks are always taken in id order so concurrent tills can't deadlock.
+# The store-wide counter row is locked last, once the cart is known to be
+# valid, so tills only queue on it for the short write tail of a bill.
+#
+# checkout_many() replays a queue of offline carts in one transaction.
+# Each cart carries a client idempotency key; a key seen before returns
+# its original bill_no instead of billing twice.
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import psycopg2.extras
+from app.scheduler import register_job
+from app.stock import describe_batches, lock_stock, record_movements, reserve_stock
+
+CHECKOUT_KEY_RETENTION = timedelta(days=30)
+
+
+class CheckoutError(Exception):
+    """Business-rule failure (unknown product, not enough stock)."""
+
+
+def normalize_items(items):
+    """Cart lines as posted by the till -> record_sale items. Raises ValueError."""
+    if not isinstance(items, list):
+        raise ValueError("items must be a list")
+
+    normalized = []
+    for i, it in enumerate(items):
+        if not isinstance(it, dict):
+            raise ValueError(f"Line {i}: not an object")
+        if it.get("product_id") is None:
+            raise ValueError(f"Line {i}: product_id is required")
+        try:
+            pid = int(it["product_id"])
+            qty = int(it.get("qty", 0))
+            unit_price = float(it.get("unit_price", 0))
+            batch_id = int(it["batch_id"]) if it.get("batch_id") is not None else None
+        except (TypeError, ValueError):
+            raise ValueError(f"Line {i}: product_id, qty, unit_price and batch_id must be numbers")
+
+        if qty <= 0:
+            raise ValueError(f"Invalid qty for product {pid}")
+
+        normalized.append({
+            "product_id": pid,
+            "qty": qty,
+            "unit_price": unit_price,
+            "batch_id": batch_id
+        })
+    return normalized
+
+
+def next_bill_no(cur, today=None):
+    """
+    Allocate BILL-YYYYMMDD-NNNN from the per-day counter row.
+
+    The upsert holds the counter row lock until the checkout commits, so
+    concurrent tills get distinct numbers and a rolled-back checkout
+    gives its number back (no gaps). Call it as late as possible: every
+    till in the store waits on this row. `today` is for load tests only.
+    """
+    today = today or datetime.now().date()
+
+    cur.execute("""
+        INSERT INTO bill_counters (bill_date, last_seq)
+        VALUES (%s, 1)
+        ON CONFLICT (bill_date) DO UPDATE
+            SET last_seq = bill_counters.last_seq + 1
+        RETURNING last_seq;
+    """, (today,))
+
+    seq = cur.fetchone()["last_seq"]
+    return f"BILL-{today:%Y%m%d}-{seq:04d}"
+
+
+def _totals_by(items, key):
+    """Sum qty per key, keeping first-seen order (error messages follow cart order)."""
+    totals = OrderedDict()
+    for it in items:
+        k = it[key]
+        if k is not None:
+            totals[k] = totals.get(k, 0) + it["qty"]
+    return totals
+
+
+def record_sale(cur, items, biller_id, today=None):
+    """
+    Validate stock and write one bill. `items` are normalised dicts
+    (product_id, qty, unit_price, batch_id). Raises CheckoutError; the
+    caller owns the transaction. Returns (bill_no, sale ids in cart order).
+    """
+    # 1️⃣ Check stock (ledger snapshot + recent movements)
+    need = _totals_by(items, "product_id")
+    stock = reserve_stock(cur, need)
+
+    for pid, qty in need.items():
+        if pid not in stock:
+            raise CheckoutError(f"Product {pid} not found")
+        if qty > stock[pid]:
+            raise CheckoutError(f"Insufficient stock for product {pid}")
+
+    # 2️⃣ Lock batches (each must be its line's product's, as for receipts)
+    batch_need = _totals_by(items, "batch_id")
+    if batch_need:
+        cur.execute("""
+            SELECT id, batch_qty, product_id
+            FROM batches
+            WHERE id = ANY(%s)
+            ORDER BY id
+            FOR UPDATE
+        """, (sorted(batch_need),))
+        batches = {r["id"]: r for r in cur.fetchall()}
+        batch_stock = {bid: (r["batch_qty"] or 0) for bid, r in batches.items()}
+
+        foreign = sorted({
+            (it["batch_id"], it["product_id"]) for it in items
+            if it["batch_id"] is not None and (
+                it["batch_id"] not in batches
+                or batches[it["batch_id"]]["product_id"] not in (None, it["product_id"])
+            )
+        })
+        if foreign:
+            raise CheckoutError(f"Batches unknown or not of the line's product: {describe_batches(foreign)}")
+
+        for bid, qty in batch_need.items():
+            if qty > batch_stock.get(bid, 0):
+                raise CheckoutError(f"Insufficient batch qty {bid}")
+
+    # 3️⃣ Bill number (counter row locked from here to commit) + header + sale lines
+    bill_no = next_bill_no(cur, today)
+    cur.execute("""
+        INSERT INTO bills (bill_no, created_at, biller_id, item_count, net_amount)
+        VALUES (%s, CURRENT_TIMESTAMP, %s, %s, %s);
+    """, (bill_no, biller_id, len(items), sum(it["qty"] * it["unit_price"] for it in items)))
+
+    rows = psycopg2.extras.execute_values(cur, """
+        INSERT INTO sales
+            (product_id, batch_id, qty_sold, sale_date, total_amount, biller_id, bill_no)
+        VALUES %s
+        RETURNING id;
+    """, [
+        (it["product_id"], it["batch_id"], it["qty"], it["qty"] * it["unit_price"], biller_id, bill_no)
+        for it in items
+    ], template="(%s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s)", page_size=len(items), fetch=True)
+    sale_ids = [r["id"] for r in rows]
+
+    # 4️⃣ Stock
+    record_movements(cur, [(pid, -qty, "sale", bill_no) for pid, qty in need.items()])
+
+    # 5️⃣ Batches
+    if batch_need:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE batches b
+            SET batch_qty = b.batch_qty - v.qty
+            FROM (VALUES %s) AS v(id, qty)
+            WHERE b.id = v.id
+        """, list(batch_need.items()), page_size=len(batch_need))
+
+    return bill_no, sale_ids
+
+
+# ----------------------------
+# Bulk (offline resync)
+# ----------------------------
+def checkout_many(cur, carts):
+    """
+    Bill a list of carts ({"key", "items", "biller_id"}, items normalised)
+    inside the caller's transaction. Returns one result per cart, in order:
+        {"key", "status": "created",  "bill_no", "sale_ids"}
+        {"key", "status": "replayed", "bill_no"}
+        {"key", "status": "failed",   "error"}
+    A failed cart (CheckoutError) is rolled back on its own and its key is
+    released, so the till can fix and resend it. Keys must be unique.
+    """
+    claimed = psycopg2.extras.execute_values(cur, """
+        INSERT INTO checkout_keys (idempotency_key)
+        VALUES %s
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING idempotency_key;
+    """, [(k,) for k in sorted(c["key"] for c in carts)], page_size=len(carts), fetch=True)
+    claimed = {r["idempotency_key"] for r in claimed}
+
+    replayed = {}
+    seen = [c["key"] for c in carts if c["key"] not in claimed]
+    if seen:
+        cur.execute("""
+            SELECT idempotency_key, bill_no
+            FROM checkout_keys
+            WHERE idempotency_key = ANY(%s);
+        """, (seen,))
+        replayed = {r["idempotency_key"]: r["bill_no"] for r in cur.fetchall()}
+
+    fresh = [c for c in carts if c["key"] in claimed]
+    product_ids = sorted({it["product_id"] for c in fresh for it in c["items"]})
+    batch_ids = sorted({it["batch_id"] for c in fresh for it in c["items"] if it["batch_id"] is not None})
+    # Same lock order as a single checkout: products, batches, then the
+    # counter (per cart, inside record_sale). Product and batch locks are
+    # taken up front, outside the per-cart savepoints, so they survive a
+    # cart being rolled back.
+    lock_stock(cur, product_ids)
+    if batch_ids:
+        cur.execute("SELECT id FROM batches WHERE id = ANY(%s) ORDER BY id FOR UPDATE;", (batch_ids,))
+
+    results = []
+    for cart in carts:
+        key = cart["key"]
+        if key not in claimed:
+            results.append({"key": key, "status": "replayed", "bill_no": replayed.get(key)})
+            continue
+
+        cur.execute("SAVEPOINT cart;")
+        try:
+            bill_no, sale_ids = record_sale(cur, cart["items"], cart["biller_id"])
+        except CheckoutError as e:
+            cur.execute("ROLLBACK TO SAVEPOINT cart;")
+            cur.execute("DELETE FROM checkout_keys WHERE idempotency_key = %s;", (key,))
+            results.append({"key": key, "status": "failed", "error": str(e)})
+            continue
+
+        cur.execute("UPDATE checkout_keys SET bill_no = %s WHERE idempotency_key = %s;", (bill_no, key))
+        cur.execute("RELEASE SAVEPOINT cart;")
+        results.append({"key": key, "status": "created", "bill_no": bill_no, "sale_ids": sale_ids})
+
+    return results
+
+
+def prune_checkout_keys(conn):
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM checkout_keys WHERE created_at < NOW() - %s;",
+        (CHECKOUT_KEY_RETENTION,)
+    )
+    cur.close()
+
+
+register_job("prune_checkout_keys", 86400, prune_checkout_keys)
@@ -0,0 +1,92 @@
+# NextGen/app/catalog.py
+# Versioned product catalogue for the billing tills.
+#
+# A till downloads the full catalogue once, then asks for
+# "changed since <watermark>": rows whose updated_at moved (trigger from
+# migration 6) plus tombstones for deleted products. Each delta overlaps
+# the previous one by SYNC_OVERLAP so rows written by transactions that
+# were still open at the last watermark are not missed; the client's
+# merge is idempotent, so the overlap only costs a few repeated rows.
+
+from datetime import datetime, timedelta
+import psycopg2.extras
+from app.scheduler import register_job
+
+SYNC_OVERLAP = timedelta(seconds=30)
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+def fetch_catalog(conn, since=None):
+    """
+    Returns {"watermark", "full", "products", "deleted"}.
+
+    A full snapshot is sent when `since` is missing or older than the
+    tombstone retention window (deletions before that are forgotten).
+    """
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    # Watermarks are naive, in the database session's time zone. A `since`
+    # with an offset is converted into the same frame by the server.
+    cur.execute(
+        "SELECT NOW()::timestamp AS now, %s::timestamptz::timestamp AS since;",
+        (since if since is not None and since.tzinfo is not None else None,)
+    )
+    row = cur.fetchone()
+    watermark = row["now"]
+    if since is not None and since.tzinfo is not None:
+        since = row["since"]
+
+    full = since is None or since < watermark - TOMBSTONE_RETENTION
+
+    if full:
+        cur.execute("""
+            SELECT id, name, selling_price, stock_qty
+            FROM products
+            ORDER BY id;
+        """)
+        products = cur.fetchall()
+        deleted = []
+    else:
+        horizon = since - SYNC_OVERLAP
+        cur.execute("""
+            SELECT id, name, selling_price, stock_qty
+            FROM products
+            WHERE updated_at > %s
+            ORDER BY id;
+        """, (horizon,))
+        products = cur.fetchall()
+
+        cur.execute("""
+            SELECT product_id
+            FROM product_tombstones
+            WHERE deleted_at > %s;
+        """, (horizon,))
+        deleted = [r["product_id"] for r in cur.fetchall()]
+
+    cur.close()
+
+    return {
+        "watermark": watermark.isoformat(),
+        "full": full,
+        "products": products,
+        "deleted": deleted
+    }
+
+
+def parse_watermark(raw):
+    """ISO timestamp from the till, naive or with an offset. Raises ValueError."""
+    if not raw:
+        return None
+    return datetime.fromisoformat(raw)
+
+
+def prune_tombstones(conn):
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM product_tombstones WHERE deleted_at < NOW() - %s;",
+        (TOMBSTONE_RETENTION,)
+    )
+    cur.close()
+
+
+register_job("prune_product_tombstones", 86400, prune_tombstones)
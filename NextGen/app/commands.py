@@ -0,0 +1,103 @@
+# NextGen/app/commands.py
+# Flask CLI commands:  flask --app run <command>
+
+import click
+from app.db import connect
+
+
+def register_commands(app):
+
+    @app.cli.command("db-migrate")
+    def db_migrate():
+        """Apply pending schema migrations."""
+        from app.migrations import migrate
+
+        conn = connect()
+        try:
+            applied = migrate(conn)
+        finally:
+            conn.close()
+
+        if not applied:
+            click.echo("Schema up to date.")
+        for version, description in applied:
+            click.echo(f"Applied {version:03d}: {description}")
+
+    @app.cli.command("run-job")
+    @click.argument("name")
+    def run_job_cmd(name):
+        """Run one scheduled job now (e.g. prune_activities)."""
+        from app.scheduler import run_job, job_names
+
+        if name not in job_names():
+            raise click.BadParameter(f"unknown job, choose from: {', '.join(job_names())}")
+        if run_job(name):
+            click.echo(f"{name}: done")
+        else:
+            click.echo(f"{name}: skipped, already running in another process")
+
+    @app.cli.command("backfill-sales-daily")
+    @click.option("--since", default=None, help="Only rebuild days on/after YYYY-MM-DD.")
+    def backfill_sales_daily_cmd(since):
+        """Rebuild the sales_daily rollup from raw sales."""
+        from app.rollups import backfill_sales_daily
+
+        conn = connect()
+        try:
+            written = backfill_sales_daily(conn, since=since)
+        finally:
+            conn.close()
+        click.echo(f"sales_daily: {written} rows written")
+
+    @app.cli.command("export-bills")
+    @click.option("--from", "date_from", required=True, type=click.DateTime(["%Y-%m-%d"]))
+    @click.option("--to", "date_to", default=None, type=click.DateTime(["%Y-%m-%d"]))
+    @click.option("--out", required=True, type=click.Path(dir_okay=False, writable=True))
+    @click.option("--workers", default=None, type=int, help="Render processes (default: CPU count).")
+    def export_bills_cmd(date_from, date_to, out, workers):
+        """Render every bill in a date range to a ZIP of PDFs."""
+        from app.documents import iter_bills_in_range, iter_rendered_bills, stream_bills_zip
+
+        date_from = date_from.date()
+        date_to = date_to.date() if date_to else date_from
+
+        count = 0
+
+        def counted(rendered):
+            nonlocal count
+            for item in rendered:
+                count += 1
+                yield item
+
+        conn = connect()
+        try:
+            bills = iter_bills_in_range(conn, date_from, date_to)
+            with open(out, "wb") as f:
+                for chunk in stream_bills_zip(counted(iter_rendered_bills(bills, workers))):
+                    f.write(chunk)
+        finally:
+            conn.close()
+
+        click.echo(f"Exported {count} bills to {out}")
+
+    @app.cli.command("import-data")
+    @click.argument("kind", type=click.Choice(["products", "suppliers", "sales"]))
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--chunk-rows", default=50_000, show_default=True, help="Rows per COPY chunk.")
+    def import_data_cmd(kind, path, chunk_rows):
+        """Bulk-load a CSV/XLSX file via COPY and merge it into the live tables."""
+        from app.importer import import_file, ImportFileError
+
+        conn = connect()
+        try:
+            report = import_file(conn, kind, path, chunk_rows=chunk_rows)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+        finally:
+            conn.close()
+
+        click.echo(f"{report.rows_read} rows read, {report.rows_rejected} rejected, "
+                   f"{report.duplicates} already imported "
+                   f"in {report.seconds:.2f}s ({report.rows_per_sec:,.0f} rows/s)")
+        for table, n in report.inserted.items():
+            click.echo(f"  {table}: {n} inserted, {report.updated.get(table, 0)} updated")
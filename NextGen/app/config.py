@@ -1,9 +1,43 @@
 import os
+import tempfile
 from urllib.parse import urlparse
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev_secret_key")
 
+    # Dashboard KPI cache — TTL backstop (seconds) behind NOTIFY invalidation
+    KPI_CACHE_TTL = int(os.environ.get("KPI_CACHE_TTL", 60))
+
+    # Background maintenance jobs (see app/scheduler.py)
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") == "1"
+
+    # Recent activity feed — rows kept by the hourly prune job
+    ACTIVITY_KEEP_ROWS = int(os.environ.get("ACTIVITY_KEEP_ROWS", 5000))
+
+    # Analytics materialized views — refresh period (seconds)
+    ANALYTICS_REFRESH_INTERVAL = int(os.environ.get("ANALYTICS_REFRESH_INTERVAL", 300))
+
+    # Billing typeahead index — rebuilt on product changes, at least this often (seconds)
+    SEARCH_INDEX_TTL = int(os.environ.get("SEARCH_INDEX_TTL", 300))
+
+    # Rendered bill PDFs / print pages (see app/documents.py)
+    DOC_CACHE_DIR = os.environ.get("DOC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ngim-docs"))
+    DOC_CACHE_MAX_BYTES = int(os.environ.get("DOC_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+    # Render processes shared by a worker's bulk bill exports
+    DOC_EXPORT_WORKERS = int(os.environ.get("DOC_EXPORT_WORKERS", min(4, os.cpu_count() or 2)))
+
+    # Stock ledger (see app/stock.py) — compaction period (seconds)
+    STOCK_COMPACT_INTERVAL = int(os.environ.get("STOCK_COMPACT_INTERVAL", 10))
+
+    # Auto-order engine (see app/reorder.py) — scheduled run period (seconds)
+    AUTO_ORDER_INTERVAL = int(os.environ.get("AUTO_ORDER_INTERVAL", 300))
+
+    # Reorder planner (see app/planner.py) — re-plan period (seconds)
+    REORDER_PLAN_INTERVAL = int(os.environ.get("REORDER_PLAN_INTERVAL", 3600))
+
+    # Expiry alerts (see app/alerts.py) — refresh period (seconds)
+    EXPIRY_ALERT_INTERVAL = int(os.environ.get("EXPIRY_ALERT_INTERVAL", 300))
+
     # If running on Render, DATABASE_URL will exist
     DATABASE_URL = os.environ.get("DATABASE_URL")
 
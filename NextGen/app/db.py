@@ -4,24 +4,28 @@ import psycopg2.extras
 from flask import g
 from app.config import Config
 
+def connect():
+    """Open a new connection (used by get_db and by background threads)."""
+    DATABASE_URL = os.environ.get("DATABASE_URL")
+
+    if DATABASE_URL:
+        return psycopg2.connect(
+            DATABASE_URL,
+            cursor_factory=psycopg2.extras.RealDictCursor,
+            sslmode="require"
+        )
+
+    return psycopg2.connect(
+        dbname=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        cursor_factory=psycopg2.extras.RealDictCursor
+    )
+
 def get_db():
     if "db" not in g:
-        DATABASE_URL = os.environ.get("DATABASE_URL")
-
-        if DATABASE_URL:
-            g.db = psycopg2.connect(
-                DATABASE_URL,
-                cursor_factory=psycopg2.extras.RealDictCursor,
-                sslmode="require"
-            )
-        else:
-            g.db = psycopg2.connect(
-                dbname=Config.DB_NAME,
-                user=Config.DB_USER,
-                password=Config.DB_PASSWORD,
-                host=Config.DB_HOST,
-                port=Config.DB_PORT,
-                cursor_factory=psycopg2.extras.RealDictCursor
-            )
+        g.db = connect()
 
     return g.db
@@ -0,0 +1,409 @@
+# NextGen/app/documents.py
+# Bill documents (PDF + print page) and their on-disk render cache.
+#
+# A bill never changes after checkout, so the first render is written to
+# DOC_CACHE_DIR as  <bill_no>.<kind>.<LAYOUT_VERSION>.<sha256[:16]>.<ext>
+# and later requests stream the file without touching the database. The
+# hash doubles as the HTTP ETag. Bump LAYOUT_VERSION when the invoice
+# layout changes so old renders are ignored (and aged out by eviction).
+#
+# Bulk export renders many bills in a process pool and streams them out
+# as a ZIP without holding the archive in memory. Each web worker keeps
+# one pool for all its exports; a handful of bills is drawn inline.
+
+import glob
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+import psycopg2.extras
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from app.config import Config
+
+LAYOUT_VERSION = "v1"
+
+_BILL_NO_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+_evict_lock = threading.Lock()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# ----------------------------
+# Data
+# ----------------------------
+def fetch_bill_items(cur, bill_no):
+    cur.execute("""
+        SELECT
+            s.product_id,
+            p.name AS product_name,
+            s.qty_sold,
+            s.total_amount,
+            s.sale_date,
+            COALESCE(s.biller_id, 1) AS biller_id
+        FROM sales s
+        LEFT JOIN products p ON s.product_id = p.id
+        WHERE s.bill_no = %s
+        ORDER BY s.id;
+    """, (bill_no,))
+    return cur.fetchall()
+
+
+# ----------------------------
+# PDF layout
+# ----------------------------
+def render_bill_pdf(bill_no, items):
+    """Draw the invoice for one bill and return the PDF bytes."""
+
+    # -----------------------------
+    # CALCULATIONS
+    # -----------------------------
+    total = sum(float(i["total_amount"]) for i in items)
+    gst = round(total * 0.18, 2)
+    grand_total = round(total + gst, 2)
+
+    # -----------------------------
+    # PDF SETUP
+    # -----------------------------
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+
+    x_left = 20 * mm
+    y = 280 * mm
+
+    # -----------------------------
+    # HEADER
+    # -----------------------------
+    pdf.setFont("Helvetica-Bold", 22)
+    pdf.drawString(x_left, y, "NXT GEN Inventory")
+
+    pdf.setFont("Helvetica", 11)
+    y -= 10 * mm
+    pdf.drawString(x_left, y, "Bengaluru – 560003")
+    y -= 6 * mm
+    pdf.drawString(x_left, y, "Phone: +91 3121030103")
+    y -= 6 * mm
+    pdf.drawString(x_left, y, "GSTIN: 29CYCM2314CT17")
+
+    y -= 8 * mm
+    pdf.line(x_left, y, 190 * mm, y)
+    y -= 10 * mm
+
+    # -----------------------------
+    # BILL INFO
+    # -----------------------------
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(x_left, y, f"Bill No: {bill_no}")
+    y -= 7 * mm
+
+    pdf.drawString(x_left, y, f"Date: {items[0]['sale_date']}")
+    y -= 7 * mm
+
+    pdf.drawString(x_left, y, f"Biller ID: {items[0]['biller_id']}")
+    y -= 10 * mm
+
+    # -----------------------------
+    # TABLE HEADER
+    # -----------------------------
+    pdf.setFont("Helvetica-Bold", 13)
+    pdf.drawString(x_left, y, "Product")
+    pdf.drawString(100 * mm, y, "Qty")
+    pdf.drawString(130 * mm, y, "Price")
+    pdf.drawString(160 * mm, y, "Total")
+
+    y -= 6 * mm
+    pdf.line(x_left, y, 190 * mm, y)
+    y -= 8 * mm
+
+    # -----------------------------
+    # TABLE ROWS
+    # -----------------------------
+    pdf.setFont("Helvetica", 12)
+
+    for it in items:
+        price_per_unit = float(it["total_amount"]) / int(it["qty_sold"])
+
+        pdf.drawString(x_left, y, it["product_name"] or "")
+        pdf.drawString(100 * mm, y, str(it["qty_sold"]))
+        pdf.drawString(130 * mm, y, f"Rs. {price_per_unit:.2f}")
+        pdf.drawString(160 * mm, y, f"Rs. {float(it['total_amount']):.2f}")
+
+        y -= 7 * mm
+
+    # -----------------------------
+    # TOTALS
+    # -----------------------------
+    y -= 5 * mm
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(x_left, y, f"Subtotal: Rs. {total:.2f}")
+    y -= 7 * mm
+
+    pdf.drawString(x_left, y, f"GST (18%): Rs. {gst:.2f}")
+    y -= 7 * mm
+
+    pdf.drawString(x_left, y, f"Grand Total: Rs. {grand_total:.2f}")
+    y -= 15 * mm
+
+    # -----------------------------
+    # FOOTER
+    # -----------------------------
+    pdf.setFont("Helvetica-Oblique", 12)
+    pdf.drawString(x_left, y, "Thank you for shopping with NXT GEN Inventory!")
+
+    pdf.showPage()
+    pdf.save()
+
+    return buffer.getvalue()
+
+
+# ----------------------------
+# Render cache
+# ----------------------------
+def _cache_dir():
+    os.makedirs(Config.DOC_CACHE_DIR, exist_ok=True)
+    return Config.DOC_CACHE_DIR
+
+
+def cache_lookup(bill_no, kind):
+    """Return (path, etag) of a cached render, or None."""
+    if not _BILL_NO_RE.match(bill_no):
+        return None
+    pattern = os.path.join(_cache_dir(), f"{bill_no}.{kind}.{LAYOUT_VERSION}.*")
+    for path in glob.glob(pattern):
+        etag = os.path.basename(path).split(".")[3]
+        try:
+            os.utime(path)          # recency for eviction
+        except OSError:
+            continue                # evicted meanwhile
+        return path, etag
+    return None
+
+
+def cache_store(bill_no, kind, ext, data):
+    """
+    Write a render atomically and return (path, etag). path is None when
+    the render could not be cached; the caller then serves `data` directly.
+    """
+    etag = hashlib.sha256(data).hexdigest()[:16]
+    if not _BILL_NO_RE.match(bill_no):
+        return None, etag
+
+    try:
+        directory = _cache_dir()
+        path = os.path.join(directory, f"{bill_no}.{kind}.{LAYOUT_VERSION}.{etag}.{ext}")
+
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        _evict()
+    except OSError:
+        return None, etag
+
+    return path, etag
+
+
+def _evict():
+    """Delete least-recently-used renders until the cache fits DOC_CACHE_MAX_BYTES."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(Config.DOC_CACHE_DIR):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+        if total <= Config.DOC_CACHE_MAX_BYTES:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            if total <= Config.DOC_CACHE_MAX_BYTES:
+                break
+
+
+# ----------------------------
+# Bulk export (date range -> ZIP of PDFs)
+# ----------------------------
+EXPORT_FETCH_SIZE = 2000        # rows per round trip from the server-side cursor
+INLINE_RENDER_MAX = 8           # exports up to this many bills skip the process pool
+
+
+def iter_bills_in_range(conn, date_from, date_to):
+    """
+    Yield (bill_no, items) for every bill created in [date_from, date_to]
+    (inclusive days). One query, streamed through a named cursor.
+    """
+    cur = conn.cursor("bill_export", cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.itersize = EXPORT_FETCH_SIZE
+    cur.execute("""
+        SELECT
+            b.bill_no,
+            s.product_id,
+            p.name AS product_name,
+            s.qty_sold,
+            s.total_amount,
+            s.sale_date,
+            COALESCE(s.biller_id, 1) AS biller_id
+        FROM bills b
+        JOIN sales s ON s.bill_no = b.bill_no
+        LEFT JOIN products p ON s.product_id = p.id
+        WHERE b.created_at >= %s
+          AND b.created_at < %s
+        ORDER BY b.created_at, b.bill_no, s.id;
+    """, (date_from, date_to + timedelta(days=1)))
+
+    try:
+        for bill_no, rows in itertools.groupby(cur, key=lambda r: r["bill_no"]):
+            yield bill_no, [dict(r) for r in rows]
+    finally:
+        cur.close()
+        conn.rollback()     # end the read transaction the named cursor opened
+
+
+def _render_job(bill_no, items):
+    return render_bill_pdf(bill_no, items)
+
+
+def _new_pool(workers):
+    # spawn, not fork: the web worker has listener/scheduler threads running
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _shared_pool():
+    """This process's render pool, started on first use."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = _new_pool(Config.DOC_EXPORT_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _drop_shared_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _cached_pdf(bill_no):
+    hit = cache_lookup(bill_no, "pdf")
+    if hit:
+        with open(hit[0], "rb") as f:
+            return f.read()
+    return None
+
+
+def _render_in_pool(pool, workers, bills):
+    pending = deque()
+
+    def drain_one():
+        bill_no, job = pending.popleft()
+        if isinstance(job, bytes):
+            return bill_no, job
+        data = job.result()
+        cache_store(bill_no, "pdf", "pdf", data)
+        return bill_no, data
+
+    try:
+        for bill_no, items in bills:
+            data = _cached_pdf(bill_no)
+            pending.append((bill_no, data if data is not None else pool.submit(_render_job, bill_no, items)))
+
+            while len(pending) >= workers * 2:
+                yield drain_one()
+
+        while pending:
+            yield drain_one()
+    finally:
+        # client went away: don't leave our renders queued in a shared pool
+        for _, job in pending:
+            if not isinstance(job, bytes):
+                job.cancel()
+
+
+def iter_rendered_bills(bills, workers=None):
+    """
+    Render (bill_no, items) pairs, yielding (bill_no, pdf_bytes) in input
+    order. Up to INLINE_RENDER_MAX bills are drawn in this process; more
+    go to a process pool with at most 2 × workers renders in flight, so
+    memory stays bounded however many bills there are. Without `workers`
+    the process's shared pool is used (web exports); with it, a pool of
+    that size lives for this export only (CLI). Cached renders are
+    reused instead of being drawn again.
+    """
+    bills = iter(bills)
+    head = list(itertools.islice(bills, INLINE_RENDER_MAX + 1))
+
+    if len(head) <= INLINE_RENDER_MAX:
+        for bill_no, items in head:
+            data = _cached_pdf(bill_no)
+            if data is None:
+                data = render_bill_pdf(bill_no, items)
+                cache_store(bill_no, "pdf", "pdf", data)
+            yield bill_no, data
+        return
+
+    bills = itertools.chain(head, bills)
+    if workers:
+        with _new_pool(workers) as pool:
+            yield from _render_in_pool(pool, workers, bills)
+        return
+
+    pool = _shared_pool()
+    try:
+        yield from _render_in_pool(pool, Config.DOC_EXPORT_WORKERS, bills)
+    except BrokenProcessPool:
+        _drop_shared_pool(pool)     # a render process died; start afresh next export
+        raise
+
+
+class _ZipStream:
+    """Write-only sink for zipfile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_bills_zip(rendered):
+    """Turn (bill_no, pdf_bytes) pairs into ZIP chunks as they arrive."""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for bill_no, data in rendered:
+            zf.writestr(f"{bill_no}.pdf", data)
+            yield sink.pop()
+    yield sink.pop()
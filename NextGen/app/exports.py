@@ -0,0 +1,95 @@
+# NextGen/app/exports.py
+# Streaming CSV exports (products, sales, orders).
+#
+# Rows come off a named (server-side) cursor EXPORT_FETCH_SIZE at a time
+# and are written out in ~64 KB chunks, so a worker holds one batch of
+# rows whatever the table size. Filters: inclusive date range on the
+# table's own date column, and product category.
+
+import csv
+import io
+import psycopg2.extensions
+from app.stock import LIVE_STOCK_SQL
+
+EXPORT_FETCH_SIZE = 5000
+FLUSH_BYTES = 64 * 1024
+
+_CATEGORY_FILTER = "(%(category)s::text IS NULL OR p.category = %(category)s)"
+
+
+def _range_filter(column):
+    return f"""
+        (%(date_from)s::date IS NULL OR {column} >= %(date_from)s::date)
+        AND (%(date_to)s::date IS NULL OR {column} < %(date_to)s::date + 1)
+    """
+
+
+# kind -> (header, query)
+EXPORTS = {
+    "products": (
+        ["id", "name", "category", "stock_qty", "selling_price", "supplier", "expiry_date", "updated_at"],
+        f"""
+            SELECT p.id, p.name, p.category,
+                   {LIVE_STOCK_SQL},
+                   p.selling_price, s.name, p.expiry_date, p.updated_at
+            FROM products p
+            LEFT JOIN suppliers s ON s.id = p.supplier_id
+            WHERE {_CATEGORY_FILTER}
+              AND {_range_filter("p.updated_at")}
+            ORDER BY p.id
+        """,
+    ),
+    "sales": (
+        ["id", "bill_no", "sale_date", "product_id", "product_name", "category",
+         "qty_sold", "total_amount", "biller_id", "batch_id"],
+        f"""
+            SELECT s.id, s.bill_no, s.sale_date, s.product_id, p.name, p.category,
+                   s.qty_sold, s.total_amount, s.biller_id, s.batch_id
+            FROM sales s
+            LEFT JOIN products p ON p.id = s.product_id
+            WHERE {_CATEGORY_FILTER}
+              AND {_range_filter("s.sale_date")}
+            ORDER BY s.id
+        """,
+    ),
+    "orders": (
+        ["id", "order_date", "product_id", "product_name", "category", "supplier",
+         "qty_ordered", "status", "generated_by"],
+        f"""
+            SELECT o.id, o.order_date, o.product_id, p.name, p.category, sup.name,
+                   o.qty_ordered, o.status, o.generated_by
+            FROM orders o
+            LEFT JOIN products p ON p.id = o.product_id
+            LEFT JOIN suppliers sup ON sup.id = o.supplier_id
+            WHERE {_CATEGORY_FILTER}
+              AND {_range_filter("o.order_date")}
+            ORDER BY o.id
+        """,
+    ),
+}
+
+
+def iter_csv(conn, kind, date_from=None, date_to=None, category=None):
+    """Yield the CSV export of `kind` as text chunks (header first)."""
+    header, sql = EXPORTS[kind]
+
+    # plain tuples: the csv writer doesn't need RealDict rows
+    cur = conn.cursor(f"export_{kind}", cursor_factory=psycopg2.extensions.cursor)
+    cur.itersize = EXPORT_FETCH_SIZE
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+
+    try:
+        cur.execute(sql, {"date_from": date_from, "date_to": date_to, "category": category})
+        for row in cur:
+            writer.writerow(row)
+            if buf.tell() >= FLUSH_BYTES:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+    finally:
+        cur.close()
+        conn.rollback()     # end the read transaction the named cursor opened
@@ -0,0 +1,415 @@
+# NextGen/app/importer.py
+# Bulk import of products, suppliers and historical sales from CSV/XLSX.
+#
+#   file --(chunks of CHUNK_ROWS)--> pandas: rename, coerce, drop bad rows
+#        --(COPY FROM STDIN)--> temp staging table
+#        --(one set-based merge per target)--> suppliers / products / sales
+#
+# Nothing is held in memory beyond one chunk, and the database sees a
+# handful of statements whatever the file size. The whole import is one
+# transaction: a failure leaves the tables untouched.
+#
+# Matching is by name (case-insensitive): products.name, suppliers.name.
+# Existing products get their price / category / supplier / expiry
+# updated; their stock is left to the stock ledger (app/stock.py) —
+# a stock figure in the file only seeds products that are new. Imported
+# sales are history: they feed sales_daily but do not move stock. Each
+# imported sale is keyed by its content (product, time, qty, amount, and
+# how many identical rows came before it in the file), so importing the
+# same or an overlapping file again skips the rows already loaded.
+#
+#   flask --app run import-data products "data/NGIM data set.xlsx"
+
+import csv
+import io
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+import pandas as pd
+from app.kpi import invalidate_kpis
+from app.search import invalidate_product_index
+
+CHUNK_ROWS = 50_000
+
+# canonical column -> accepted headers in the file (first match wins)
+COLUMNS = {
+    "products": {
+        "name": ("product_name", "name"),
+        "category": ("category",),
+        "selling_price": ("selling_price", "selling_price_per_unit", "base_price", "price"),
+        "stock_qty": ("stock_qty", "stock_available", "stock"),
+        "expiry_date": ("expiry_date",),
+        "supplier": ("supplier_name", "supplier"),
+        "lead_time": ("lead_time_days", "lead_time"),
+    },
+    "suppliers": {
+        "name": ("supplier_name", "name"),
+        "contact": ("contact",),
+        "address": ("address",),
+        "lead_time": ("lead_time_days", "lead_time"),
+    },
+    "sales": {
+        "product_name": ("product_name", "name"),
+        "product_id": ("product_id",),
+        "qty": ("quantity", "qty_sold", "qty", "units_sold"),
+        "sale_date": ("invoice_date", "sale_date", "date"),
+        "unit_price": ("unit_price", "selling_price"),
+        "total_amount": ("total_amount", "revenue", "amount"),
+    },
+}
+
+KINDS = tuple(COLUMNS)
+
+_STAGING = {
+    "products": """
+        name TEXT NOT NULL,
+        category TEXT,
+        selling_price NUMERIC(12, 2),
+        stock_qty INT,
+        expiry_date DATE,
+        supplier TEXT,
+        lead_time INT
+    """,
+    "suppliers": """
+        name TEXT NOT NULL,
+        contact TEXT,
+        address TEXT,
+        lead_time INT
+    """,
+    "sales": """
+        product_name TEXT,
+        product_id INT,
+        qty INT NOT NULL,
+        sale_date TIMESTAMP NOT NULL,
+        total_amount NUMERIC(14, 2) NOT NULL
+    """,
+}
+
+
+class ImportFileError(ValueError):
+    """The file can't be imported as the requested kind (missing columns, bad format)."""
+
+
+@dataclass
+class ImportReport:
+    kind: str
+    rows_read: int = 0
+    rows_rejected: int = 0
+    duplicates: int = 0                             # rows already imported before
+    inserted: dict = field(default_factory=dict)    # table -> rows
+    updated: dict = field(default_factory=dict)     # table -> rows
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "rows_read": self.rows_read,
+            "rows_rejected": self.rows_rejected,
+            "duplicates": self.duplicates,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec),
+        }
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def _read_chunks(path, chunk_rows):
+    """Yield DataFrames of raw (string/object) cells, CHUNK_ROWS at a time."""
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook      # only needed for spreadsheets
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(h) if h is not None else "" for h in header]
+            while True:
+                batch = list(itertools.islice(rows, chunk_rows))
+                if not batch:
+                    break
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            wb.close()
+
+    elif ext == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+
+    else:
+        raise ImportFileError(f"unsupported file type {ext!r} (expected .csv or .xlsx)")
+
+
+def _canonical(df, kind):
+    """Rename the file's headers to canonical names; absent columns become NA."""
+    headers = {str(c).strip().lower(): c for c in df.columns}
+    out = pd.DataFrame(index=df.index)
+    for name, aliases in COLUMNS[kind].items():
+        source = next((headers[a] for a in aliases if a in headers), None)
+        out[name] = df[source] if source is not None else pd.NA
+    return out
+
+
+# ----------------------------
+# Vectorized validation
+# ----------------------------
+def _text(s):
+    s = s.astype("string").str.strip()
+    return s.mask(s == "")
+
+
+def _number(s):
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _integer(s):
+    return _number(s).round().astype("Int64")
+
+
+def _date(s, fmt="%Y-%m-%d"):
+    """Parsed dates as text COPY understands; unparseable -> NA."""
+    return pd.to_datetime(s, errors="coerce").dt.strftime(fmt)
+
+
+def _clean(df, kind):
+    """Type-convert a canonical chunk; returns (clean_df, rejected_count)."""
+    if kind == "products":
+        df["name"] = _text(df["name"])
+        df["category"] = _text(df["category"])
+        df["selling_price"] = _number(df["selling_price"]).round(2)
+        df["stock_qty"] = _integer(df["stock_qty"])
+        df["expiry_date"] = _date(df["expiry_date"])
+        df["supplier"] = _text(df["supplier"])
+        df["lead_time"] = _integer(df["lead_time"])
+        ok = df["name"].notna() & (df["selling_price"].isna() | (df["selling_price"] >= 0))
+
+    elif kind == "suppliers":
+        df["name"] = _text(df["name"])
+        df["contact"] = _text(df["contact"])
+        df["address"] = _text(df["address"])
+        df["lead_time"] = _integer(df["lead_time"])
+        ok = df["name"].notna()
+
+    else:  # sales
+        df["product_name"] = _text(df["product_name"])
+        df["product_id"] = _integer(df["product_id"])
+        df["qty"] = _integer(df["qty"])
+        df["sale_date"] = _date(df["sale_date"], "%Y-%m-%d %H:%M:%S")
+        unit_price = _number(df.pop("unit_price"))
+        total = _number(df["total_amount"])
+        df["total_amount"] = total.fillna(unit_price * df["qty"]).round(2)
+        ok = (
+            (df["product_name"].notna() | df["product_id"].notna())
+            & (df["qty"] > 0).fillna(False)
+            & df["sale_date"].notna()
+            & df["total_amount"].notna()
+        )
+
+    ok = ok.fillna(False).astype(bool)
+    return df[ok], int((~ok).sum())
+
+
+def _copy_chunk(cur, table, df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="", quoting=csv.QUOTE_MINIMAL)
+    buf.seek(0)
+    cols = ", ".join(df.columns)
+    cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+# ----------------------------
+# Merge (staging -> live tables)
+# ----------------------------
+def _merge_suppliers(cur, stage, report):
+    """Insert suppliers named in `stage` that don't exist yet; fill lead time where known."""
+    cur.execute("LOCK TABLE suppliers IN SHARE ROW EXCLUSIVE MODE;")
+
+    contact = "contact" if stage == "stage_suppliers" else "NULL"
+    address = "address" if stage == "stage_suppliers" else "NULL"
+    name = "name" if stage == "stage_suppliers" else "supplier"
+
+    cur.execute(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (LOWER({name}))
+                {name} AS name, {contact} AS contact, {address} AS address, lead_time
+            FROM {stage}
+            WHERE {name} IS NOT NULL
+            ORDER BY LOWER({name}), seq DESC
+        ),
+        upd AS (
+            UPDATE suppliers x
+            SET contact = COALESCE(l.contact, x.contact),
+                address = COALESCE(l.address, x.address),
+                lead_time = COALESCE(l.lead_time, x.lead_time)
+            FROM latest l
+            WHERE LOWER(x.name) = LOWER(l.name)
+            RETURNING LOWER(x.name) AS key
+        ),
+        ins AS (
+            INSERT INTO suppliers (name, contact, address, lead_time)
+            SELECT l.name, l.contact, l.address, l.lead_time
+            FROM latest l
+            WHERE NOT EXISTS (SELECT 1 FROM suppliers x WHERE LOWER(x.name) = LOWER(l.name))
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM upd) AS updated, (SELECT COUNT(*) FROM ins) AS inserted;
+    """)
+    row = cur.fetchone()
+    report.updated["suppliers"] = row["updated"]
+    report.inserted["suppliers"] = row["inserted"]
+
+
+def _merge_products(cur, report):
+    _merge_suppliers(cur, "stage_products", report)
+
+    cur.execute("LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE;")
+    cur.execute("""
+        WITH latest AS (
+            SELECT DISTINCT ON (LOWER(s.name))
+                s.name, s.category, s.selling_price, s.stock_qty, s.expiry_date,
+                sup.id AS supplier_id
+            FROM stage_products s
+            LEFT JOIN suppliers sup ON LOWER(sup.name) = LOWER(s.supplier)
+            ORDER BY LOWER(s.name), s.seq DESC
+        ),
+        upd AS (
+            UPDATE products p
+            SET category = COALESCE(l.category, p.category),
+                selling_price = COALESCE(l.selling_price, p.selling_price),
+                supplier_id = COALESCE(l.supplier_id, p.supplier_id),
+                expiry_date = COALESCE(l.expiry_date, p.expiry_date)
+            FROM latest l
+            WHERE LOWER(p.name) = LOWER(l.name)
+            RETURNING p.id
+        ),
+        ins AS (
+            INSERT INTO products (name, category, stock_qty, selling_price, supplier_id, expiry_date)
+            SELECT l.name, l.category, COALESCE(l.stock_qty, 0), COALESCE(l.selling_price, 0),
+                   l.supplier_id, l.expiry_date
+            FROM latest l
+            WHERE NOT EXISTS (SELECT 1 FROM products p WHERE LOWER(p.name) = LOWER(l.name))
+            RETURNING id
+        )
+        SELECT (SELECT COUNT(*) FROM upd) AS updated, (SELECT COUNT(*) FROM ins) AS inserted;
+    """)
+    row = cur.fetchone()
+    report.updated["products"] = row["updated"]
+    report.inserted["products"] = row["inserted"]
+
+
+def _merge_sales(cur, report):
+    # Resolve products by name first, then by id; unresolved lines are rejected
+    cur.execute("""
+        WITH resolved AS (
+            SELECT COALESCE(byname.id, byid.id) AS product_id, s.seq, s.qty, s.sale_date, s.total_amount
+            FROM stage_sales s
+            LEFT JOIN LATERAL (
+                SELECT p.id FROM products p
+                WHERE s.product_name IS NOT NULL AND LOWER(p.name) = LOWER(s.product_name)
+                ORDER BY p.id
+                LIMIT 1
+            ) byname ON TRUE
+            LEFT JOIN products byid ON byname.id IS NULL AND byid.id = s.product_id
+        )
+        keyed AS (
+            SELECT r.*,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY product_id, sale_date, qty, total_amount
+                       ORDER BY seq
+                   ) AS occurrence
+            FROM resolved r
+            WHERE product_id IS NOT NULL
+        )
+        INSERT INTO sales (product_id, qty_sold, sale_date, total_amount, import_key)
+        SELECT product_id, qty, sale_date, total_amount,
+               md5(concat_ws('|', product_id, sale_date, qty, total_amount, occurrence))
+        FROM keyed
+        ON CONFLICT (import_key) WHERE import_key IS NOT NULL DO NOTHING;
+    """)
+    inserted = cur.rowcount
+
+    cur.execute("""
+        SELECT COUNT(*) AS staged,
+               COUNT(*) FILTER (
+                   WHERE EXISTS (SELECT 1 FROM products p WHERE LOWER(p.name) = LOWER(s.product_name))
+                      OR EXISTS (SELECT 1 FROM products p WHERE p.id = s.product_id)
+               ) AS resolved
+        FROM stage_sales s;
+    """)
+    row = cur.fetchone()
+
+    report.inserted["sales"] = inserted
+    report.duplicates += row["resolved"] - inserted
+    report.rows_rejected += row["staged"] - row["resolved"]
+
+
+# ----------------------------
+# Entry point
+# ----------------------------
+def import_file(conn, kind, path, chunk_rows=CHUNK_ROWS):
+    """
+    Import `path` as `kind` ("products", "suppliers" or "sales") and
+    commit. Returns an ImportReport. Raises ImportFileError for files that
+    don't fit the kind; any other failure rolls everything back.
+    """
+    if kind not in COLUMNS:
+        raise ImportFileError(f"kind must be one of {', '.join(KINDS)}")
+
+    report = ImportReport(kind=kind)
+    start = time.perf_counter()
+    stage = f"stage_{kind}"
+    cur = conn.cursor()
+
+    try:
+        cur.execute(f"""
+            CREATE TEMP TABLE {stage} (
+                seq BIGSERIAL,
+                {_STAGING[kind]}
+            ) ON COMMIT DROP;
+        """)
+
+        for raw in _read_chunks(path, chunk_rows):
+            report.rows_read += len(raw)
+            df = _canonical(raw, kind)
+            if kind == "sales" and df["qty"].isna().all():
+                raise ImportFileError("sales file needs a quantity column")
+            if kind != "sales" and df["name"].isna().all():
+                raise ImportFileError(f"{kind} file needs a name column")
+
+            df, rejected = _clean(df, kind)
+            report.rows_rejected += rejected
+            if len(df):
+                _copy_chunk(cur, stage, df)
+
+        cur.execute(f"ANALYZE {stage};")
+
+        if kind == "products":
+            _merge_products(cur, report)
+        elif kind == "suppliers":
+            _merge_suppliers(cur, stage, report)
+        else:
+            _merge_sales(cur, report)
+
+        # suppliers too: the cached KPI payload carries the supplier dropdown
+        invalidate_kpis(conn)
+        invalidate_product_index(conn)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,193 @@
+# NextGen/app/kpi.py
+# Dashboard KPIs — every figure shown on the main and product dashboards
+# is fetched in ONE statement (one round trip to the database), with
+# revenue and top sellers read from the sales_daily rollup. Results are
+# cached per worker until a write path invalidates them (Postgres NOTIFY)
+# or the TTL backstop expires.
+
+import threading
+import time
+from dataclasses import dataclass, field
+import psycopg2.extras
+from app.config import Config
+from app.notify import ensure_listener, notify, subscribe
+
+DEFAULT_MIN_STOCK = 40   # used when auto_order_settings is empty
+
+
+@dataclass
+class DashboardKPIs:
+    total_products: int = 0
+    min_stock_level: int = DEFAULT_MIN_STOCK
+    low_stock: int = 0
+    expiring_soon: int = 0
+    monthly_revenue: float = 0.0
+    total_revenue: float = 0.0
+    top_products: list = field(default_factory=list)   # [{product_name, units_sold, revenue}]
+    suppliers: list = field(default_factory=list)      # [{id, name}]
+    products: list = field(default_factory=list)       # [{id, name}]
+
+
+# ----------------------------
+# SQL
+# ----------------------------
+_KPI_CTES = """
+    WITH settings AS (
+        SELECT COALESCE(
+            (SELECT min_stock_level FROM auto_order_settings LIMIT 1),
+            %(default_min)s
+        )::int AS min_stock_level
+    ),
+    product_stats AS (
+        SELECT
+            COUNT(*) AS total_products,
+            COUNT(*) FILTER (
+                WHERE p.stock_qty < (SELECT min_stock_level FROM settings)
+            ) AS low_stock
+        FROM products p
+    ),
+    expiry_stats AS (
+        SELECT COUNT(*) AS expiring_soon
+        FROM alerts
+        WHERE alert_type = 'Expiry'
+          AND status = 'Active'
+    ),
+    revenue_stats AS (
+        SELECT
+            COALESCE(SUM(revenue), 0) AS total_revenue,
+            COALESCE(SUM(revenue) FILTER (
+                WHERE sale_date >= DATE_TRUNC('month', CURRENT_DATE)::date
+            ), 0) AS monthly_revenue
+        FROM sales_daily
+    )
+"""
+
+_KPI_COLUMNS = """
+        ps.total_products,
+        st.min_stock_level,
+        ps.low_stock,
+        es.expiring_soon,
+        rs.monthly_revenue,
+        rs.total_revenue
+"""
+
+_KPI_FROM = """
+    FROM settings st, product_stats ps, expiry_stats es, revenue_stats rs;
+"""
+
+_CATALOG_CTES = """,
+    top_products AS (
+        SELECT p.name AS product_name,
+               SUM(d.qty) AS units_sold,
+               SUM(d.revenue) AS revenue
+        FROM sales_daily d
+        JOIN products p ON d.product_id = p.id
+        GROUP BY p.name
+        ORDER BY revenue DESC
+        LIMIT 5
+    )
+"""
+
+_CATALOG_COLUMNS = """,
+        (SELECT COALESCE(json_agg(t ORDER BY t.revenue DESC), '[]'::json)
+           FROM top_products t) AS top_products,
+        (SELECT COALESCE(json_agg(json_build_object('id', id, 'name', name) ORDER BY name), '[]'::json)
+           FROM suppliers) AS suppliers,
+        (SELECT COALESCE(json_agg(json_build_object('id', id, 'name', name) ORDER BY name), '[]'::json)
+           FROM products) AS products
+"""
+
+
+def _build_sql(with_catalog):
+    if with_catalog:
+        return (_KPI_CTES + _CATALOG_CTES
+                + "    SELECT" + _KPI_COLUMNS + _CATALOG_COLUMNS + _KPI_FROM)
+    return _KPI_CTES + "    SELECT" + _KPI_COLUMNS + _KPI_FROM
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def fetch_dashboard_kpis(conn, with_catalog=False):
+    """
+    Fetch all dashboard figures in a single statement.
+
+    with_catalog=True also returns the top-5 sellers and the supplier /
+    product dropdown lists used by the product dashboard.
+    """
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute(_build_sql(with_catalog), {"default_min": DEFAULT_MIN_STOCK})
+        row = cur.fetchone()
+    finally:
+        cur.close()
+
+    kpis = DashboardKPIs(
+        total_products=int(row["total_products"] or 0),
+        min_stock_level=int(row["min_stock_level"]),
+        low_stock=int(row["low_stock"] or 0),
+        expiring_soon=int(row["expiring_soon"] or 0),
+        monthly_revenue=float(row["monthly_revenue"] or 0),
+        total_revenue=float(row["total_revenue"] or 0),
+    )
+
+    if with_catalog:
+        kpis.top_products = row["top_products"] or []
+        kpis.suppliers = row["suppliers"] or []
+        kpis.products = row["products"] or []
+
+    return kpis
+
+
+# ----------------------------
+# Per-worker cache + cross-worker invalidation
+# ----------------------------
+KPI_CHANNEL = "ngim_kpi_invalidate"
+
+_cache = {}                 # with_catalog -> (expires_at, DashboardKPIs)
+_cache_lock = threading.Lock()
+_generation = 0             # bumped on every invalidation
+
+
+def clear_kpi_cache(payload=None):
+    """Drop this worker's cached KPIs."""
+    global _generation
+    with _cache_lock:
+        _cache.clear()
+        _generation += 1
+
+
+def invalidate_kpis(conn):
+    """
+    Invalidate the KPI cache in every worker.
+
+    Call it inside the write transaction, before conn.commit(): NOTIFY is
+    transactional, so other workers drop their values only once the write
+    is visible (and not at all if it rolls back).
+    """
+    clear_kpi_cache()
+    notify(conn, KPI_CHANNEL)
+
+
+subscribe(KPI_CHANNEL, clear_kpi_cache)
+
+
+def get_dashboard_kpis(conn, with_catalog=False):
+    """Cached fetch_dashboard_kpis()."""
+    ensure_listener()
+
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(with_catalog)
+        if hit and hit[0] > now:
+            return hit[1]
+        generation = _generation
+
+    kpis = fetch_dashboard_kpis(conn, with_catalog=with_catalog)
+
+    with _cache_lock:
+        # Don't store values that were read before an invalidation landed
+        if generation == _generation:
+            _cache[with_catalog] = (now + Config.KPI_CACHE_TTL, kpis)
+
+    return kpis
@@ -0,0 +1,418 @@
+# NextGen/app/migrations.py
+# Schema migrations — applied in order, each exactly once, tracked in
+# schema_migrations. Run with:  flask --app run db-migrate
+
+import psycopg2.extras
+
+# (version, description, sql) — append only, never edit a shipped entry
+MIGRATIONS = [
+    (1, "recent_activities table + latest-first index", """
+        CREATE TABLE IF NOT EXISTS recent_activities (
+            id SERIAL PRIMARY KEY,
+            activity_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_recent_activities_created_at
+            ON recent_activities (created_at DESC);
+    """),
+
+    (2, "sales_daily rollup maintained by a statement-level trigger on sales", """
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            sale_date DATE NOT NULL,
+            product_id INT NOT NULL,
+            qty BIGINT NOT NULL DEFAULT 0,
+            revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (sale_date, product_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_sales_daily_product
+            ON sales_daily (product_id);
+
+        CREATE OR REPLACE FUNCTION sales_daily_apply() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sales_daily (sale_date, product_id, qty, revenue)
+            SELECT sale_date::date, product_id, SUM(qty_sold), SUM(total_amount)
+            FROM new_rows
+            WHERE sale_date IS NOT NULL AND product_id IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (sale_date, product_id) DO UPDATE
+                SET qty = sales_daily.qty + EXCLUDED.qty,
+                    revenue = sales_daily.revenue + EXCLUDED.revenue;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_sales_daily ON sales;
+        CREATE TRIGGER trg_sales_daily
+            AFTER INSERT ON sales
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE sales_daily_apply();
+
+        LOCK TABLE sales IN SHARE MODE;
+        DELETE FROM sales_daily;
+        INSERT INTO sales_daily (sale_date, product_id, qty, revenue)
+        SELECT sale_date::date, product_id, SUM(qty_sold), SUM(total_amount)
+        FROM sales
+        WHERE sale_date IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY 1, 2;
+    """),
+
+    (3, "materialized analytics views (category + per-product lifetime sales)", """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_product_sales AS
+        SELECT
+            p.id,
+            p.name,
+            p.category,
+            COALESCE(SUM(d.qty), 0) AS total_qty,
+            COALESCE(SUM(d.revenue), 0) AS total_revenue
+        FROM products p
+        LEFT JOIN sales_daily d ON d.product_id = p.id
+        GROUP BY p.id, p.name, p.category;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_product_sales_id
+            ON mv_product_sales (id);
+        CREATE INDEX IF NOT EXISTS idx_mv_product_sales_rank
+            ON mv_product_sales (total_qty DESC, id DESC);
+
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_category_sales AS
+        SELECT
+            COALESCE(p.category, 'Uncategorized') AS category,
+            COALESCE(SUM(d.qty), 0) AS total_qty
+        FROM products p
+        LEFT JOIN sales_daily d ON d.product_id = p.id
+        GROUP BY 1;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_category_sales_category
+            ON mv_category_sales (category);
+
+        CREATE TABLE IF NOT EXISTS mv_refresh_log (
+            view_name TEXT PRIMARY KEY,
+            refreshed_at TIMESTAMP NOT NULL
+        );
+        INSERT INTO mv_refresh_log (view_name, refreshed_at)
+        VALUES ('mv_product_sales', NOW()), ('mv_category_sales', NOW())
+        ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+    """),
+
+    (4, "per-day bill number counters", """
+        CREATE TABLE IF NOT EXISTS bill_counters (
+            bill_date DATE PRIMARY KEY,
+            last_seq INT NOT NULL
+        );
+
+        INSERT INTO bill_counters (bill_date, last_seq)
+        SELECT TO_DATE(SUBSTRING(bill_no FROM 6 FOR 8), 'YYYYMMDD'),
+               MAX(SPLIT_PART(bill_no, '-', 3)::int)
+        FROM sales
+        WHERE bill_no ~ '^BILL-[0-9]{8}-[0-9]+$'
+        GROUP BY 1
+        ON CONFLICT (bill_date) DO NOTHING;
+    """),
+
+    (5, "bills header table, backfilled; sales.bill_no references it", """
+        CREATE TABLE IF NOT EXISTS bills (
+            bill_no TEXT PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            biller_id INT,
+            item_count INT NOT NULL,
+            net_amount NUMERIC(14, 2) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_bills_created_at
+            ON bills (created_at DESC, bill_no DESC);
+        CREATE INDEX IF NOT EXISTS idx_sales_bill_no
+            ON sales (bill_no);
+
+        LOCK TABLE sales IN SHARE MODE;
+        INSERT INTO bills (bill_no, created_at, biller_id, item_count, net_amount)
+        SELECT bill_no,
+               MIN(sale_date),
+               MIN(COALESCE(biller_id, 1)),
+               COUNT(*),
+               COALESCE(SUM(total_amount), 0)
+        FROM sales
+        WHERE bill_no IS NOT NULL
+        GROUP BY bill_no
+        ON CONFLICT (bill_no) DO NOTHING;
+
+        ALTER TABLE sales
+            ADD CONSTRAINT fk_sales_bill_no
+            FOREIGN KEY (bill_no) REFERENCES bills (bill_no);
+    """),
+
+    (6, "products.updated_at maintained by trigger + delete tombstones for catalogue sync", """
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+        CREATE OR REPLACE FUNCTION products_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_products_updated_at ON products;
+        CREATE TRIGGER trg_products_updated_at
+            BEFORE INSERT OR UPDATE ON products
+            FOR EACH ROW EXECUTE PROCEDURE products_touch_updated_at();
+
+        CREATE INDEX IF NOT EXISTS idx_products_updated_at
+            ON products (updated_at);
+
+        CREATE TABLE IF NOT EXISTS product_tombstones (
+            product_id INT PRIMARY KEY,
+            deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_product_tombstones_deleted_at
+            ON product_tombstones (deleted_at);
+
+        CREATE OR REPLACE FUNCTION products_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_tombstones (product_id, deleted_at)
+            VALUES (OLD.id, NOW())
+            ON CONFLICT (product_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_products_tombstone ON products;
+        CREATE TRIGGER trg_products_tombstone
+            AFTER DELETE ON products
+            FOR EACH ROW EXECUTE PROCEDURE products_tombstone();
+    """),
+
+    (7, "checkout idempotency keys for offline till resync", """
+        CREATE TABLE IF NOT EXISTS checkout_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            bill_no TEXT REFERENCES bills (bill_no),
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_checkout_keys_created_at
+            ON checkout_keys (created_at);
+    """),
+
+    (8, "append-only stock ledger; products.stock_qty becomes its compacted snapshot", """
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id BIGSERIAL PRIMARY KEY,
+            product_id INT NOT NULL,
+            delta INT NOT NULL,
+            reason TEXT NOT NULL,
+            ref TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_stock_movements_product
+            ON stock_movements (product_id, id);
+
+        -- Movements with id <= last_movement_id are folded into products.stock_qty
+        CREATE TABLE IF NOT EXISTS stock_snapshot_state (
+            singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            last_movement_id BIGINT NOT NULL DEFAULT 0,
+            compacted_at TIMESTAMP
+        );
+        INSERT INTO stock_snapshot_state DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE VIEW product_stock AS
+        SELECT p.id AS product_id,
+               COALESCE(p.stock_qty, 0) + COALESCE(SUM(m.delta), 0) AS stock_qty
+        FROM products p
+        CROSS JOIN stock_snapshot_state s
+        LEFT JOIN stock_movements m
+               ON m.product_id = p.id
+              AND m.id > s.last_movement_id
+        GROUP BY p.id;
+    """),
+
+    (9, "trigram + keyset indexes for the product listing", """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        CREATE INDEX IF NOT EXISTS idx_products_name_trgm
+            ON products USING gin (LOWER(name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_products_category_id
+            ON products ((COALESCE(category, '')), id);
+        CREATE INDEX IF NOT EXISTS idx_products_supplier_id
+            ON products ((COALESCE(supplier_id, 0)), id);
+    """),
+
+    (10, "indexes for the set-based auto-order engine", """
+        CREATE INDEX IF NOT EXISTS idx_product_rules_product
+            ON product_rules (product_id);
+        CREATE INDEX IF NOT EXISTS idx_orders_pending_product
+            ON orders (product_id)
+            WHERE status = 'Pending';
+    """),
+
+    (11, "NOTIFY ngim_low_stock when a ledger write leaves products at/below min_stock_level", """
+        CREATE OR REPLACE FUNCTION stock_movements_low_stock() RETURNS trigger AS $$
+        DECLARE
+            ids TEXT;
+        BEGIN
+            SELECT string_agg(d.product_id::text, ',' ORDER BY d.product_id) INTO ids
+            FROM (
+                SELECT product_id, SUM(delta) AS delta
+                FROM new_rows
+                GROUP BY product_id
+            ) d
+            JOIN products p ON p.id = d.product_id
+            WHERE d.delta < 0
+              AND COALESCE(p.stock_qty, 0) + COALESCE((
+                      SELECT SUM(m.delta)
+                      FROM stock_movements m
+                      WHERE m.product_id = p.id
+                        AND m.id > (SELECT last_movement_id FROM stock_snapshot_state)
+                  ), 0)
+                  <= COALESCE((SELECT min_stock_level FROM auto_order_settings LIMIT 1), 40);
+
+            IF ids IS NOT NULL THEN
+                -- NOTIFY payloads are capped at 8000 bytes; '*' = check everything
+                IF length(ids) > 7900 THEN
+                    ids := '*';
+                END IF;
+                PERFORM pg_notify('ngim_low_stock', ids);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_stock_movements_low_stock ON stock_movements;
+        CREATE TRIGGER trg_stock_movements_low_stock
+            AFTER INSERT ON stock_movements
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE stock_movements_low_stock();
+    """),
+
+    (12, "forecast-driven reorder plan columns on product_rules", """
+        ALTER TABLE product_rules
+            ADD COLUMN IF NOT EXISTS daily_demand NUMERIC(12, 3),
+            ADD COLUMN IF NOT EXISTS safety_stock INT,
+            ADD COLUMN IF NOT EXISTS target_stock INT,
+            ADD COLUMN IF NOT EXISTS suggested_quantity INT,
+            ADD COLUMN IF NOT EXISTS planned_at TIMESTAMP;
+    """),
+
+    (13, "purchase_orders: pending auto-orders consolidated per supplier", """
+        CREATE TABLE IF NOT EXISTS purchase_orders (
+            id SERIAL PRIMARY KEY,
+            supplier_id INT NOT NULL REFERENCES suppliers(id),
+            status TEXT NOT NULL DEFAULT 'Open',
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        ALTER TABLE orders
+            ADD COLUMN IF NOT EXISTS purchase_order_id INT REFERENCES purchase_orders(id);
+
+        CREATE INDEX IF NOT EXISTS idx_orders_purchase_order
+            ON orders (purchase_order_id);
+        CREATE INDEX IF NOT EXISTS idx_orders_unconsolidated
+            ON orders (supplier_id)
+            WHERE status = 'Pending' AND purchase_order_id IS NULL;
+    """),
+
+    (14, "alerts.expiry_date + unique (product_id, alert_type, expiry_date) for incremental expiry alerts", """
+        ALTER TABLE alerts ADD COLUMN IF NOT EXISTS expiry_date DATE;
+
+        UPDATE alerts a
+        SET expiry_date = p.expiry_date
+        FROM products p
+        WHERE p.id = a.product_id
+          AND a.alert_type = 'Expiry'
+          AND a.expiry_date IS NULL;
+
+        -- the old delete-and-reinsert could leave duplicates behind
+        DELETE FROM alerts a
+        USING alerts b
+        WHERE a.alert_type = 'Expiry'
+          AND b.alert_type = a.alert_type
+          AND b.product_id = a.product_id
+          AND b.expiry_date = a.expiry_date
+          AND b.id < a.id;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_alerts_product_type_expiry
+            ON alerts (product_id, alert_type, expiry_date);
+        CREATE INDEX IF NOT EXISTS idx_alerts_open_expiry
+            ON alerts (expiry_date)
+            WHERE alert_type = 'Expiry' AND status <> 'Retired';
+    """),
+
+    (15, "batches.product_id so goods receipts can check batch ownership", """
+        ALTER TABLE batches
+            ADD COLUMN IF NOT EXISTS product_id INT REFERENCES products(id) ON DELETE SET NULL;
+
+        -- backfill from sales history where a batch was only ever sold as one product
+        UPDATE batches b
+        SET product_id = s.product_id
+        FROM (
+            SELECT batch_id, MIN(product_id) AS product_id
+            FROM sales
+            WHERE batch_id IS NOT NULL
+            GROUP BY batch_id
+            HAVING COUNT(DISTINCT product_id) = 1
+        ) s
+        WHERE b.id = s.batch_id
+          AND b.product_id IS NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_batches_product ON batches (product_id);
+    """),
+
+    (16, "sales.import_key so re-importing a sales file doesn't duplicate history", """
+        ALTER TABLE sales ADD COLUMN IF NOT EXISTS import_key TEXT;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_sales_import_key
+            ON sales (import_key)
+            WHERE import_key IS NOT NULL;
+    """),
+
+    (17, "stock_movements.purchase_order_id: receipts booked against a purchase order", """
+        ALTER TABLE stock_movements
+            ADD COLUMN IF NOT EXISTS purchase_order_id INT REFERENCES purchase_orders(id);
+
+        CREATE INDEX IF NOT EXISTS idx_stock_movements_purchase_order
+            ON stock_movements (purchase_order_id, product_id)
+            WHERE purchase_order_id IS NOT NULL;
+    """),
+]
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def pending_migrations(conn):
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    _ensure_migrations_table(cur)
+    cur.execute("SELECT version FROM schema_migrations;")
+    done = {r["version"] for r in cur.fetchall()}
+    cur.close()
+    conn.commit()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction. Returns the applied list."""
+    applied = []
+    cur = conn.cursor()
+
+    # Serialise concurrent deploys (two workers / release + web)
+    cur.execute("SELECT pg_advisory_lock(hashtext('ngim:migrations'));")
+    try:
+        for version, description, sql in pending_migrations(conn):
+            try:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                    (version, description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append((version, description))
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(hashtext('ngim:migrations'));")
+        conn.commit()
+        cur.close()
+
+    return applied
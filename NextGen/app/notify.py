@@ -0,0 +1,93 @@
+# NextGen/app/notify.py
+# Cross-worker signals over Postgres LISTEN/NOTIFY.
+# One listener thread per process fans notifications out to the handlers
+# subscribed for each channel. After (re)connecting, every handler is
+# called with payload=None: notifications may have been missed, so
+# per-worker caches should drop everything.
+
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+from app.db import connect
+
+log = logging.getLogger(__name__)
+
+_handlers = defaultdict(list)      # channel -> [handler(payload)]
+_lock = threading.Lock()
+_listener_pid = None
+
+
+def subscribe(channel, handler):
+    """Call handler(payload) in this process whenever `channel` is notified."""
+    with _lock:
+        _handlers[channel].append(handler)
+
+
+def notify(conn, channel, payload=""):
+    """
+    Queue a notification on conn's transaction. It is delivered to every
+    worker on commit, and dropped on rollback.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_notify(%s, %s);", (channel, payload))
+    cur.close()
+
+
+def _dispatch(channel, payload):
+    with _lock:
+        handlers = list(_handlers.get(channel, ()))
+    for handler in handlers:
+        try:
+            handler(payload)
+        except Exception:
+            log.exception("notify handler for %s failed", channel)
+
+
+def _listen_forever():
+    while True:
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            cur = conn.cursor()
+            listening = set()
+
+            while True:
+                with _lock:
+                    wanted = set(_handlers)
+                for channel in sorted(wanted - listening):
+                    cur.execute(f'LISTEN "{channel}";')
+                    listening.add(channel)
+                    _dispatch(channel, None)
+
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    _dispatch(n.channel, n.payload)
+        except Exception:
+            log.warning("LISTEN connection lost, reconnecting", exc_info=True)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def ensure_listener():
+    """Start the listener thread once per process (gunicorn forks after import)."""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+    threading.Thread(target=_listen_forever, name="ngim-listener", daemon=True).start()
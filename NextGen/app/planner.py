@@ -0,0 +1,127 @@
+# NextGen/app/planner.py
+# Forecast-driven reorder planning for the whole catalogue in one pass.
+#
+# Per product, from the last HISTORY_DAYS of sales_daily:
+#   daily demand   d = units / HISTORY_DAYS        (days without sales count as 0)
+#   daily std      σ = sqrt(E[q²] - d²)
+#   lead time      L = supplier lead_time, else auto_order_settings.lead_time_days
+#   safety stock   SS = z · σ · √L
+#   target stock   T = d · (L + REVIEW_DAYS) + SS  (order-up-to level)
+#   suggestion     max(0, T - current stock)
+#
+# The inputs come from one query and the maths is numpy over whole
+# columns, so 10k SKUs plan in milliseconds; results go back in one
+# UPDATE ... FROM (VALUES ...). The auto-order engine (app/reorder.py)
+# orders up to target_stock, falling back to the fixed reorder_quantity
+# for products with no plan or no demand.
+#
+# Same sizing idea as ai_engine.compute_inventory (forecast → days of
+# supply → suggested order), but fed from the live database instead of
+# the CSV snapshot the recommendation pages use.
+
+import logging
+import time
+import numpy as np
+import psycopg2.extras
+from app.config import Config
+from app.reorder import provision_rules
+from app.scheduler import register_job
+
+log = logging.getLogger(__name__)
+
+HISTORY_DAYS = 56
+REVIEW_DAYS = 7             # cover until the next planning/ordering cycle
+SERVICE_LEVEL_Z = 1.65      # ~95% cycle service level
+DEFAULT_LEAD_DAYS = 7
+
+
+def _load_inputs(cur):
+    cur.execute("""
+        WITH hist AS (
+            SELECT product_id,
+                   SUM(qty) AS units,
+                   SUM(qty * qty) AS units_sq
+            FROM sales_daily
+            WHERE sale_date > CURRENT_DATE - %(days)s
+            GROUP BY product_id
+        ),
+        settings AS (
+            SELECT COALESCE(
+                (SELECT lead_time_days FROM auto_order_settings LIMIT 1),
+                %(default_lead)s
+            ) AS lead_days
+        )
+        SELECT p.id,
+               COALESCE(h.units, 0) AS units,
+               COALESCE(h.units_sq, 0) AS units_sq,
+               COALESCE(s.lead_time, st.lead_days) AS lead_days,
+               ps.stock_qty
+        FROM products p
+        JOIN product_stock ps ON ps.product_id = p.id
+        LEFT JOIN hist h ON h.product_id = p.id
+        LEFT JOIN suppliers s ON s.id = p.supplier_id
+        CROSS JOIN settings st
+        ORDER BY p.id;
+    """, {"days": HISTORY_DAYS, "default_lead": DEFAULT_LEAD_DAYS})
+    return cur.fetchall()
+
+
+def compute_plan(ids, units, units_sq, lead_days, stock):
+    """
+    Vectorized plan over numpy arrays (one element per product).
+    Returns rows (product_id, daily_demand, safety_stock, target_stock,
+    suggested_quantity).
+    """
+    demand = units / HISTORY_DAYS
+    std = np.sqrt(np.maximum(units_sq / HISTORY_DAYS - demand ** 2, 0.0))
+    lead = np.maximum(lead_days, 1.0)
+
+    safety = np.ceil(SERVICE_LEVEL_Z * std * np.sqrt(lead))
+    target = np.ceil(demand * (lead + REVIEW_DAYS) + safety)
+    suggested = np.maximum(target - stock, 0.0)
+
+    return list(zip(
+        ids.tolist(),
+        np.round(demand, 3).tolist(),
+        safety.astype(int).tolist(),
+        target.astype(int).tolist(),
+        suggested.astype(int).tolist(),
+    ))
+
+
+def plan_reorders(conn):
+    """Re-plan every product and store the result on product_rules. Returns the product count."""
+    start = time.perf_counter()
+    cur = conn.cursor()
+
+    provision_rules(cur)
+    rows = _load_inputs(cur)
+    if not rows:
+        cur.close()
+        return 0
+
+    plan = compute_plan(
+        np.fromiter((r["id"] for r in rows), dtype=np.int64, count=len(rows)),
+        np.fromiter((r["units"] for r in rows), dtype=float, count=len(rows)),
+        np.fromiter((r["units_sq"] for r in rows), dtype=float, count=len(rows)),
+        np.fromiter((r["lead_days"] or DEFAULT_LEAD_DAYS for r in rows), dtype=float, count=len(rows)),
+        np.fromiter((r["stock_qty"] for r in rows), dtype=float, count=len(rows)),
+    )
+
+    psycopg2.extras.execute_values(cur, """
+        UPDATE product_rules pr
+        SET daily_demand = v.daily_demand,
+            safety_stock = v.safety_stock,
+            target_stock = v.target_stock,
+            suggested_quantity = v.suggested_quantity,
+            planned_at = NOW()
+        FROM (VALUES %s) AS v(product_id, daily_demand, safety_stock, target_stock, suggested_quantity)
+        WHERE pr.product_id = v.product_id
+    """, plan, template="(%s, %s::numeric, %s, %s, %s)", page_size=len(plan))
+    cur.close()
+
+    log.info("reorder plan: %d products in %.3fs", len(plan), time.perf_counter() - start)
+    return len(plan)
+
+
+register_job("reorder_plan", Config.REORDER_PLAN_INTERVAL, plan_reorders)
@@ -0,0 +1,291 @@
+# NextGen/app/reorder.py
+# Auto-order engine — set-based, off the request path.
+#
+#   provision_rules()   one INSERT ... SELECT for products without a rule
+#   run_auto_orders()   one INSERT INTO orders ... SELECT for every enabled
+#                       product at or below min_stock_level that has no
+#                       pending auto-order yet
+#   close_purchase_orders()
+#                       PO lines whose quantity has been received against
+#                       that PO become 'Received'; a PO with no pending
+#                       lines left becomes 'Closed'
+#   consolidate_purchase_orders()
+#                       one purchase order per supplier for the pending
+#                       auto-orders not on a PO yet (orders become its lines)
+#
+# All run from the scheduler (job "auto_order"); the reorder page only
+# reads. Purchase orders are only issued by the scheduled run, so a
+# supplier gets one document per AUTO_ORDER_INTERVAL however many
+# low-stock events arrived in between. A transaction-level advisory lock
+# serialises engine runs, so the NOT EXISTS check can't race another run
+# into a duplicate order.
+#
+# Between scheduled runs, reorders are event-driven: a trigger on
+# stock_movements (migration 11) NOTIFYs ngim_low_stock with the ids of
+# products a write left at/below min_stock_level. Each worker collects
+# those ids for REORDER_BATCH_WINDOW seconds and runs the engine for just
+# that set. Every worker hears every NOTIFY, so the same batch may be
+# run more than once — the advisory lock + NOT EXISTS make that a no-op.
+
+import logging
+import os
+import threading
+import time
+from app.activity import log_activity
+from app.config import Config
+from app.db import connect
+from app.kpi import DEFAULT_MIN_STOCK
+from app.notify import ensure_listener, subscribe
+from app.scheduler import register_job
+from app.stock import LIVE_STOCK_SQL
+
+log = logging.getLogger(__name__)
+
+DEFAULT_REORDER_QTY = 10
+AUTO_ORDER_BY = 1           # orders.generated_by for engine-created orders
+PURCHASE_ORDER_URL = "/dashboard/reorder/po/"   # + purchase_orders.id
+
+LOW_STOCK_CHANNEL = "ngim_low_stock"
+REORDER_BATCH_WINDOW = 2.0  # seconds to collect low-stock events before acting
+
+
+def _lock_engine(cur):
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('ngim:auto_order'));")
+
+
+def provision_rules(cur, product_ids=None):
+    """Give products (all, or `product_ids`) without a rule the default one. Returns rows added."""
+    cur.execute("""
+        INSERT INTO product_rules (product_id, reorder_quantity, is_enabled)
+        SELECT p.id, %(qty)s, TRUE
+        FROM products p
+        WHERE (%(ids)s::int[] IS NULL OR p.id = ANY(%(ids)s::int[]))
+          AND NOT EXISTS (
+              SELECT 1 FROM product_rules pr WHERE pr.product_id = p.id
+          );
+    """, {
+        "qty": DEFAULT_REORDER_QTY,
+        "ids": sorted(product_ids) if product_ids is not None else None,
+    })
+    return cur.rowcount
+
+
+def run_auto_orders(cur, product_ids=None):
+    """
+    Create pending auto-orders for low-stock products (all, or just
+    `product_ids`). Stock is ledger-exact; the quantity tops stock up to
+    the planned target_stock, or is the rule's reorder_quantity when the
+    product has no plan. Returns the new orders as
+    [{id, product_id, qty_ordered}].
+    """
+    cur.execute(f"""
+        WITH settings AS (
+            SELECT COALESCE(
+                (SELECT min_stock_level FROM auto_order_settings LIMIT 1),
+                %(default_min)s
+            )::int AS min_stock_level
+        )
+        INSERT INTO orders (
+            product_id, supplier_id, qty_ordered,
+            order_date, status, generated_by, order_form_url
+        )
+        SELECT p.id, p.supplier_id,
+               -- order up to the planned target (app/planner.py); fixed qty if unplanned
+               COALESCE(NULLIF(GREATEST(pr.target_stock - ls.stock, 0), 0), pr.reorder_quantity),
+               NOW(), 'Pending', %(by)s, NULL
+        FROM products p
+        JOIN product_rules pr ON pr.product_id = p.id AND pr.is_enabled = TRUE
+        CROSS JOIN LATERAL (SELECT {LIVE_STOCK_SQL} AS stock) ls
+        CROSS JOIN settings st
+        WHERE p.stock_qty IS NOT NULL
+          AND ls.stock <= st.min_stock_level
+          AND (%(ids)s::int[] IS NULL OR p.id = ANY(%(ids)s::int[]))
+          AND NOT EXISTS (
+              SELECT 1 FROM orders o
+              WHERE o.product_id = p.id
+                AND o.status = 'Pending'
+                AND o.generated_by = %(by)s
+          )
+        RETURNING id, product_id, qty_ordered;
+    """, {
+        "default_min": DEFAULT_MIN_STOCK,
+        "by": AUTO_ORDER_BY,
+        "ids": sorted(product_ids) if product_ids is not None else None,
+    })
+    return cur.fetchall()
+
+
+def close_purchase_orders(cur):
+    """
+    Mark pending PO lines 'Received' once receipts booked against their
+    purchase order (stock_movements.purchase_order_id) cover the ordered
+    quantity, then close purchase orders that have no pending lines left.
+    Receipts without a PO (e.g. /increase-stock) never close anything.
+    Returns the number of POs closed.
+    """
+    cur.execute("""
+        UPDATE orders o
+        SET status = 'Received'
+        FROM (
+            SELECT purchase_order_id, product_id, SUM(delta) AS received
+            FROM stock_movements
+            WHERE purchase_order_id IN (SELECT id FROM purchase_orders WHERE status = 'Open')
+              AND reason = 'receipt'
+            GROUP BY purchase_order_id, product_id
+        ) r
+        WHERE o.purchase_order_id = r.purchase_order_id
+          AND o.product_id = r.product_id
+          AND o.status = 'Pending'
+          AND o.generated_by = %s
+          AND r.received >= o.qty_ordered;
+    """, (AUTO_ORDER_BY,))
+
+    cur.execute("""
+        UPDATE purchase_orders po
+        SET status = 'Closed'
+        WHERE po.status = 'Open'
+          AND NOT EXISTS (
+              SELECT 1 FROM orders o
+              WHERE o.purchase_order_id = po.id
+                AND o.status = 'Pending'
+          );
+    """)
+    return cur.rowcount
+
+
+def consolidate_purchase_orders(cur):
+    """
+    Group pending auto-orders that aren't on a purchase order yet into one
+    purchase order per supplier; the orders become its lines and link to
+    the PO document. One statement whatever the number of suppliers.
+    Orders without a supplier are left as they are. Returns
+    [{id, supplier_id, lines}].
+    """
+    cur.execute("""
+        WITH po AS (
+            INSERT INTO purchase_orders (supplier_id)
+            SELECT DISTINCT o.supplier_id
+            FROM orders o
+            WHERE o.status = 'Pending'
+              AND o.generated_by = %(by)s
+              AND o.purchase_order_id IS NULL
+              AND o.supplier_id IS NOT NULL
+            ORDER BY o.supplier_id
+            RETURNING id, supplier_id
+        ),
+        lines AS (
+            UPDATE orders o
+            SET purchase_order_id = po.id,
+                order_form_url = %(url)s || po.id
+            FROM po
+            WHERE o.supplier_id = po.supplier_id
+              AND o.status = 'Pending'
+              AND o.generated_by = %(by)s
+              AND o.purchase_order_id IS NULL
+            RETURNING o.purchase_order_id
+        )
+        SELECT po.id, po.supplier_id, COUNT(*) AS lines
+        FROM po
+        JOIN lines ON lines.purchase_order_id = po.id
+        GROUP BY po.id, po.supplier_id
+        ORDER BY po.id;
+    """, {"by": AUTO_ORDER_BY, "url": PURCHASE_ORDER_URL})
+    return cur.fetchall()
+
+
+def _log_run(created, purchase_orders=()):
+    if purchase_orders:
+        log_activity(
+            f"Auto-reorder triggered for {len(created)} products "
+            f"({len(purchase_orders)} purchase orders)"
+        )
+    elif created:
+        log_activity(f"Auto-reorder triggered for {len(created)} products")
+
+
+def auto_order_job(conn):
+    cur = conn.cursor()
+    _lock_engine(cur)
+    added = provision_rules(cur)
+    closed = close_purchase_orders(cur)
+    created = run_auto_orders(cur)
+    purchase_orders = consolidate_purchase_orders(cur)
+    cur.close()
+
+    if added:
+        log.info("auto-order: %d product rules provisioned", added)
+    if closed:
+        log.info("auto-order: %d purchase orders closed", closed)
+    _log_run(created, purchase_orders)
+
+
+register_job("auto_order", Config.AUTO_ORDER_INTERVAL, auto_order_job)
+
+
+# ----------------------------
+# Event-driven reorders
+# ----------------------------
+_ALL = "*"
+
+_pending = set()            # product ids (or _ALL) waiting for the next batch
+_pending_lock = threading.Lock()
+_wakeup = threading.Event()
+_reorder_pid = None
+
+
+def _on_low_stock(payload):
+    # payload None = listener (re)connected and may have missed events
+    ids = {_ALL} if not payload or payload == _ALL else {int(x) for x in payload.split(",")}
+    with _pending_lock:
+        _pending.update(ids)
+    _wakeup.set()
+
+
+subscribe(LOW_STOCK_CHANNEL, _on_low_stock)
+
+
+def _take_batch():
+    with _pending_lock:
+        batch = set(_pending)
+        _pending.clear()
+    return None if _ALL in batch else batch
+
+
+def _reorder_forever():
+    while True:
+        _wakeup.wait()
+        time.sleep(REORDER_BATCH_WINDOW)     # let the burst finish
+        _wakeup.clear()
+        product_ids = _take_batch()
+        if product_ids is not None and not product_ids:
+            continue
+
+        conn = None
+        try:
+            conn = connect()
+            cur = conn.cursor()
+            _lock_engine(cur)
+            # lines only: the scheduled run puts them on purchase orders
+            created = run_auto_orders(cur, product_ids)
+            conn.commit()
+            cur.close()
+            _log_run(created)
+        except Exception:
+            log.exception("event-driven reorder failed; the scheduled run will catch up")
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_reorder_listener():
+    """Start this worker's reorder batcher once per process (safe to call on every request)."""
+    global _reorder_pid
+    pid = os.getpid()
+    if _reorder_pid == pid:
+        return
+    with _pending_lock:
+        if _reorder_pid == pid:
+            return
+        _reorder_pid = pid
+    ensure_listener()
+    threading.Thread(target=_reorder_forever, name="ngim-reorder", daemon=True).start()
@@ -0,0 +1,74 @@
+# NextGen/app/rollups.py
+# sales_daily — one row per (day, product) with qty and revenue.
+# The trg_sales_daily trigger (migration 2) keeps it current on every
+# INSERT INTO sales; reports read it instead of scanning raw sale lines.
+#
+# mv_product_sales / mv_category_sales (migration 3) hold lifetime
+# totals for the analytics page and are refreshed CONCURRENTLY by a
+# scheduled job, so readers never block on (or block) checkout.
+
+import psycopg2.extras
+from app.config import Config
+from app.scheduler import register_job
+
+ANALYTICS_VIEWS = ("mv_product_sales", "mv_category_sales")
+
+
+def backfill_sales_daily(conn, since=None):
+    """
+    Rebuild sales_daily from the raw sales table (all history, or from
+    `since` onwards). Blocks sales writers for the duration so no
+    trigger update is lost. Returns the number of rollup rows written.
+    """
+    cur = conn.cursor()
+    cur.execute("LOCK TABLE sales IN SHARE MODE;")
+
+    if since:
+        cur.execute("DELETE FROM sales_daily WHERE sale_date >= %s;", (since,))
+    else:
+        cur.execute("DELETE FROM sales_daily;")
+
+    cur.execute("""
+        INSERT INTO sales_daily (sale_date, product_id, qty, revenue)
+        SELECT sale_date::date, product_id, SUM(qty_sold), SUM(total_amount)
+        FROM sales
+        WHERE sale_date IS NOT NULL
+          AND product_id IS NOT NULL
+          AND (%(since)s::date IS NULL OR sale_date >= %(since)s::date)
+        GROUP BY 1, 2;
+    """, {"since": since})
+    written = cur.rowcount
+
+    conn.commit()
+    cur.close()
+    return written
+
+
+def refresh_analytics_views(conn):
+    """REFRESH ... CONCURRENTLY every analytics view and record when."""
+    cur = conn.cursor()
+    for view in ANALYTICS_VIEWS:
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+        cur.execute("""
+            INSERT INTO mv_refresh_log (view_name, refreshed_at)
+            VALUES (%s, NOW())
+            ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+        """, (view,))
+        conn.commit()
+    cur.close()
+
+
+def analytics_refreshed_at(conn):
+    """Oldest refresh time across the analytics views (None if never refreshed)."""
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute("""
+        SELECT MIN(refreshed_at) AS refreshed_at
+        FROM mv_refresh_log
+        WHERE view_name = ANY(%s);
+    """, (list(ANALYTICS_VIEWS),))
+    row = cur.fetchone()
+    cur.close()
+    return row["refreshed_at"] if row else None
+
+
+register_job("refresh_analytics_views", Config.ANALYTICS_REFRESH_INTERVAL, refresh_analytics_views)
@@ -2,51 +2,18 @@ from flask import Blueprint, render_template, jsonify
 import psycopg2.extras
 from datetime import datetime
 from app.db import get_db
+from app.kpi import invalidate_kpis
+import app.alerts  # noqa: F401  registers the "expiry_alerts" job
 alerts_bp = Blueprint("alerts_bp", __name__, url_prefix="/alerts")
 
 
-# --------------------------------------------------------
-# AUTO-GENERATE EXPIRY ALERTS (Next 30 Days ONLY)
-# --------------------------------------------------------
-def generate_auto_alerts():
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    # 1️⃣ Remove old expiry alerts
-    cur.execute("""
-        DELETE FROM alerts
-        WHERE alert_type = 'Expiry';
-    """)
-
-    # 2️⃣ Insert fresh alerts (next 30 days only)
-    cur.execute("""
-        INSERT INTO alerts (product_id, alert_type, message, status, sent_date)
-        SELECT
-            p.id,
-            'Expiry',
-            CONCAT(p.name, ' is expiring on ', p.expiry_date),
-            'Active',
-            NOW()
-        FROM products p
-        WHERE p.expiry_date IS NOT NULL
-          AND p.expiry_date > CURRENT_DATE
-          AND p.expiry_date <= CURRENT_DATE + INTERVAL '30 days';
-    """)
-
-    conn.commit()
-    cur.close()
-
-
-
-
 # --------------------------------------------------------
 # LOAD ALERTS PAGE
 # --------------------------------------------------------
 @alerts_bp.route("/")
 def alerts_home():
 
-    generate_auto_alerts()  # Auto-generate alerts
-
+    # Read-only: alerts are maintained by the "expiry_alerts" job (app/alerts.py)
     conn = get_db()
 
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
@@ -56,13 +23,14 @@ def alerts_home():
             a.id AS alert_id,
             a.product_id,
             p.name AS product_name,
-            p.expiry_date,
+            a.expiry_date,
             a.sent_date,
             a.status
         FROM alerts a
         JOIN products p ON p.id = a.product_id
         WHERE a.alert_type = 'Expiry'
-        ORDER BY p.expiry_date ASC;
+          AND a.status <> 'Retired'
+        ORDER BY a.expiry_date ASC;
     """)
 
     alerts = cur.fetchall()
@@ -98,5 +66,6 @@ def resolve_alert(id):
         WHERE id = %s;
     """, (id,))
 
+    invalidate_kpis(conn)
     conn.commit()
     return jsonify({"message": "Alert marked as resolved"})
@@ -1,64 +1,231 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, jsonify
+from datetime import date
 import psycopg2.extras
 from app.db import get_db
+from app.rollups import analytics_refreshed_at
 analytics_bp = Blueprint("analytics_bp", __name__, url_prefix="/analytics")
 
+PRODUCT_PAGE_SIZE = 50
+MAX_PRODUCT_PAGE_SIZE = 500
+
+
+# --------------------------------------------------------
+# HELPERS
+# --------------------------------------------------------
+def _date_range():
+    """Parse ?from=YYYY-MM-DD&to=YYYY-MM-DD (both optional, inclusive)."""
+    def parse(name):
+        raw = request.args.get(name)
+        if not raw:
+            return None
+        return date.fromisoformat(raw)
+
+    return {"date_from": parse("from"), "date_to": parse("to")}
+
+
+# Applied to sales_daily aliased as d
+_RANGE_FILTER = """
+    (%(date_from)s::date IS NULL OR d.sale_date >= %(date_from)s::date)
+    AND (%(date_to)s::date IS NULL OR d.sale_date <= %(date_to)s::date)
+"""
+
+
+def _bad_range():
+    return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+
+
+# --------------------------------------------------------
+# PAGE — summary only, charts and tables load via the API
+# --------------------------------------------------------
 @analytics_bp.route("/")
 def analytics_dashboard():
     conn = get_db()
 
-    # use RealDictCursor for convenience
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    # 1) Revenue + Profit (from sales) - unchanged logic but safe casting
     cur.execute("""
         SELECT
-            DATE_TRUNC('month', sale_date) AS month_dt,
-            TO_CHAR(DATE_TRUNC('month', sale_date), 'Mon') AS month_label,
-            SUM(total_amount) AS revenue,
-            SUM(total_amount * 0.20) AS profit
-        FROM sales
-        GROUP BY month_dt
-        ORDER BY month_dt;
+            COALESCE(SUM(revenue), 0) AS revenue,
+            COALESCE(SUM(qty), 0) AS units,
+            COUNT(DISTINCT product_id) AS products_sold
+        FROM sales_daily;
     """)
-    raw_rp = cur.fetchall()
-    revenue_profit = [
-        [ row["month_label"], float(row["revenue"] or 0), float(row["profit"] or 0) ]
-        for row in raw_rp
-    ]
+    summary = cur.fetchone()
+    cur.close()
 
-    # 2) Category sales — include categories with zero sales
-    #    Left join products -> sales so categories present in products show up even if no sales
-    cur.execute("""
+    return render_template(
+        "analytics/analytics_dashboard.html",
+        summary=summary,
+        refreshed_at=analytics_refreshed_at(conn)
+    )
+
+
+# --------------------------------------------------------
+# JSON API
+# --------------------------------------------------------
+@analytics_bp.route("/api/summary")
+def api_summary():
+    try:
+        rng = _date_range()
+    except ValueError:
+        return _bad_range()
+
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(f"""
         SELECT
-            p.category AS category,
-            COALESCE(SUM(s.qty_sold), 0) AS total_qty
-        FROM products p
-        LEFT JOIN sales s ON s.product_id = p.id
-        GROUP BY p.category
-        ORDER BY total_qty DESC NULLS LAST, p.category;
-    """)
-    raw_cat = cur.fetchall()
-    category_sales = [
-        [ row["category"], int(row["total_qty"] or 0) ]
-        for row in raw_cat
-    ]
+            COALESCE(SUM(d.revenue), 0) AS revenue,
+            COALESCE(SUM(d.revenue * 0.20), 0) AS profit,
+            COALESCE(SUM(d.qty), 0) AS units,
+            COUNT(DISTINCT d.product_id) AS products_sold
+        FROM sales_daily d
+        WHERE {_RANGE_FILTER};
+    """, rng)
+    row = cur.fetchone()
+    cur.close()
 
-    # 3) Per-product totals (so you can display a product list + sales counts; includes zero)
-    cur.execute("""
+    return jsonify({
+        "revenue": float(row["revenue"]),
+        "profit": float(row["profit"]),
+        "units": int(row["units"]),
+        "products_sold": int(row["products_sold"])
+    })
+
+
+@analytics_bp.route("/api/revenue")
+def api_revenue():
+    """Monthly revenue + profit series: [[label, revenue, profit], ...]."""
+    try:
+        rng = _date_range()
+    except ValueError:
+        return _bad_range()
+
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.execute(f"""
         SELECT
-            p.id,
-            p.name,
-            p.category,
-            COALESCE(SUM(s.qty_sold), 0) AS total_qty,
-            p.stock_qty
-        FROM products p
-        LEFT JOIN sales s ON s.product_id = p.id
-        GROUP BY p.id, p.name, p.category, p.stock_qty
-        ORDER BY total_qty DESC, p.name;
-    """)
-    raw_prod = cur.fetchall()
-    product_sales = [
+            DATE_TRUNC('month', d.sale_date) AS month_dt,
+            TO_CHAR(DATE_TRUNC('month', d.sale_date), 'Mon YYYY') AS month_label,
+            SUM(d.revenue) AS revenue,
+            SUM(d.revenue * 0.20) AS profit
+        FROM sales_daily d
+        WHERE {_RANGE_FILTER}
+        GROUP BY month_dt
+        ORDER BY month_dt;
+    """, rng)
+    rows = cur.fetchall()
+    cur.close()
+
+    return jsonify([
+        [row["month_label"], float(row["revenue"] or 0), float(row["profit"] or 0)]
+        for row in rows
+    ])
+
+
+@analytics_bp.route("/api/categories")
+def api_categories():
+    """Units sold per category (categories with zero sales included): [[category, qty], ...]."""
+    try:
+        rng = _date_range()
+    except ValueError:
+        return _bad_range()
+
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    if rng["date_from"] is None and rng["date_to"] is None:
+        # Lifetime totals come precomputed from the materialized view
+        cur.execute("""
+            SELECT category, total_qty
+            FROM mv_category_sales
+            ORDER BY total_qty DESC, category;
+        """)
+    else:
+        cur.execute(f"""
+            SELECT
+                COALESCE(p.category, 'Uncategorized') AS category,
+                COALESCE(SUM(d.qty), 0) AS total_qty
+            FROM products p
+            LEFT JOIN sales_daily d
+                   ON d.product_id = p.id
+                  AND {_RANGE_FILTER}
+            GROUP BY 1
+            ORDER BY total_qty DESC, category;
+        """, rng)
+    rows = cur.fetchall()
+    cur.close()
+
+    return jsonify([
+        [row["category"], int(row["total_qty"] or 0)]
+        for row in rows
+    ])
+
+
+@analytics_bp.route("/api/products")
+def api_products():
+    """
+    Per-product units sold, best sellers first, keyset-paginated.
+
+    Pass back the `next` cursor from the previous page as
+    ?after_qty=<total_qty>&after_id=<id>; `next` is null on the last page.
+    """
+    try:
+        rng = _date_range()
+        limit = min(int(request.args.get("limit", PRODUCT_PAGE_SIZE)), MAX_PRODUCT_PAGE_SIZE)
+        after_qty = request.args.get("after_qty")
+        after_id = request.args.get("after_id")
+        after_qty = int(after_qty) if after_qty is not None else None
+        after_id = int(after_id) if after_id is not None else None
+    except ValueError:
+        return jsonify({"error": "invalid from/to/limit/after_qty/after_id"}), 400
+
+    if (after_qty is None) != (after_id is None):
+        return jsonify({"error": "after_qty and after_id go together"}), 400
+
+    params = dict(rng, limit=max(limit, 1), after_qty=after_qty, after_id=after_id)
+
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    if rng["date_from"] is None and rng["date_to"] is None:
+        # Lifetime totals: walk idx_mv_product_sales_rank, stock comes live by PK
+        cur.execute("""
+            SELECT m.id, m.name, m.category, m.total_qty, p.stock_qty
+            FROM mv_product_sales m
+            LEFT JOIN products p ON p.id = m.id
+            WHERE %(after_id)s::int IS NULL
+               OR (m.total_qty, m.id) < (%(after_qty)s::bigint, %(after_id)s::int)
+            ORDER BY m.total_qty DESC, m.id DESC
+            LIMIT %(limit)s;
+        """, params)
+    else:
+        cur.execute(f"""
+            WITH totals AS (
+                SELECT d.product_id, SUM(d.qty) AS total_qty
+                FROM sales_daily d
+                WHERE {_RANGE_FILTER}
+                GROUP BY d.product_id
+            ),
+            ranked AS (
+                SELECT
+                    p.id,
+                    p.name,
+                    p.category,
+                    COALESCE(t.total_qty, 0) AS total_qty,
+                    p.stock_qty
+                FROM products p
+                LEFT JOIN totals t ON t.product_id = p.id
+            )
+            SELECT *
+            FROM ranked
+            WHERE %(after_id)s::int IS NULL
+               OR (total_qty, id) < (%(after_qty)s::bigint, %(after_id)s::int)
+            ORDER BY total_qty DESC, id DESC
+            LIMIT %(limit)s;
+        """, params)
+    rows = cur.fetchall()
+    cur.close()
+
+    items = [
         {
             "id": row["id"],
             "name": row["name"],
@@ -66,19 +233,12 @@ def analytics_dashboard():
             "total_qty": int(row["total_qty"] or 0),
             "stock_qty": int(row["stock_qty"] or 0)
         }
-        for row in raw_prod
+        for row in rows
     ]
 
-    cur.close()
-
-    # debug prints (optional)
-    print("DEBUG RP:", revenue_profit)
-    print("DEBUG CAT:", category_sales[:10])
-    print("DEBUG PROD sample:", product_sales[:5])
+    next_cursor = None
+    if len(items) == params["limit"]:
+        last = items[-1]
+        next_cursor = {"after_qty": last["total_qty"], "after_id": last["id"]}
 
-    return render_template(
-        "analytics/analytics_dashboard.html",
-        revenue_profit=revenue_profit,
-        category_sales=category_sales,
-        product_sales=product_sales
-    )
+    return jsonify({"items": items, "next": next_cursor})
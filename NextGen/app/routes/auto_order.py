@@ -2,101 +2,12 @@ from flask import Blueprint, render_template, request, jsonify,  abort
 import psycopg2.extras
 from datetime import datetime
 from app.db import get_db
+from app.kpi import invalidate_kpis
+from app.reorder import AUTO_ORDER_BY
+import app.planner  # noqa: F401  registers the "reorder_plan" job
 auto_order_bp = Blueprint("auto_order_bp", __name__, url_prefix="/dashboard/reorder")
 
 
-# =======================================================
-# 📌 Ensure every product has a rule
-# =======================================================
-def ensure_rules_exist():
-    conn = get_db()
-
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    cur.execute("""
-        SELECT p.id, p.name 
-        FROM products p
-        LEFT JOIN product_rules pr ON pr.product_id = p.id
-        WHERE pr.id IS NULL;
-    """)
-    missing = cur.fetchall()
-
-    for item in missing:
-        cur.execute("""
-            INSERT INTO product_rules (product_id, reorder_quantity, is_enabled)
-            VALUES (%s, 10, TRUE);
-        """, (item["id"],))
-
-    conn.commit()
-
-
-# =======================================================
-# ⭐ AUTO-ORDER ENGINE — Only when stock < threshold
-# =======================================================
-def run_auto_order_engine():
-    conn = get_db()
-
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-    # Load global settings
-    cur.execute("SELECT * FROM auto_order_settings LIMIT 1;")
-    settings = cur.fetchone()
-    min_stock = settings["min_stock_level"]
-
-    # Load products + rules
-    cur.execute("""
-        SELECT 
-            p.id AS product_id,
-            p.name,
-            p.stock_qty,
-            p.supplier_id,
-            s.name AS supplier_name,
-            pr.reorder_quantity,
-            pr.is_enabled
-        FROM products p
-        JOIN product_rules pr ON pr.product_id = p.id
-        LEFT JOIN suppliers s ON s.id = p.supplier_id
-        WHERE pr.is_enabled = TRUE;
-    """)
-    products = cur.fetchall()
-
-    for p in products:
-
-        # STEP 1 — Stock must be low
-        if p["stock_qty"] is None or p["stock_qty"] > min_stock:
-            continue
-
-        # STEP 2 — Prevent duplicate auto orders
-        cur.execute("""
-            SELECT id FROM orders
-            WHERE product_id = %s AND status = 'Pending' AND generated_by = 1
-            LIMIT 1;
-        """, (p["product_id"],))
-        existing = cur.fetchone()
-
-        if existing:
-            continue  # Skip duplicate
-
-        # STEP 3 — Create new auto-order
-        qty = p["reorder_quantity"]
-
-        cur.execute("""
-            INSERT INTO orders (
-                product_id, supplier_id, qty_ordered,
-                order_date, status, generated_by, order_form_url
-            )
-            VALUES (%s, %s, %s, NOW(), 'Pending', 1, NULL)
-        """, (
-            p["product_id"],
-            p["supplier_id"],
-            qty
-        ))
-
-        print("AUTO ORDER GENERATED:", p["name"], "| Qty:", qty)
-
-    conn.commit()
-
-
 # =======================================================
 # 📌 AUTO-ORDER PAGE
 # =======================================================
@@ -106,8 +17,7 @@ def auto_order_page():
 
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    ensure_rules_exist()
-    run_auto_order_engine()   # ⭐ Auto-generates orders safely
+    # Read-only: rules and orders are created by the "auto_order" job (app/reorder.py)
 
     # Load global settings
     cur.execute("SELECT * FROM auto_order_settings LIMIT 1;")
@@ -120,7 +30,10 @@ def auto_order_page():
             p.name AS product_name,
             pr.id AS rule_id,
             COALESCE(pr.reorder_quantity, 10) AS reorder_quantity,
-            COALESCE(pr.is_enabled, TRUE) AS is_enabled
+            COALESCE(pr.is_enabled, TRUE) AS is_enabled,
+            pr.target_stock,
+            pr.suggested_quantity,
+            pr.planned_at
         FROM products p
         LEFT JOIN product_rules pr ON p.id = pr.product_id
         ORDER BY p.id;
@@ -142,10 +55,10 @@ def auto_order_page():
         FROM orders o
         LEFT JOIN products p ON o.product_id = p.id
         LEFT JOIN suppliers s ON o.supplier_id = s.id
-        WHERE o.generated_by = 1
+        WHERE o.generated_by = %s
         ORDER BY o.order_date DESC
         LIMIT 100;
-    """)
+    """, (AUTO_ORDER_BY,))
     rows = cur.fetchall()
 
     activity = []
@@ -203,6 +116,7 @@ def toggle_global():
         WHERE id = 1;
     """, (data["min_stock_level"], data["lead_time_days"]))
 
+    invalidate_kpis(conn)   # low-stock count depends on min_stock_level
     conn.commit()
     return jsonify({"message": "Updated"})
 
@@ -282,25 +196,79 @@ def order_report(order_id):
     except:
         date_long = str(r["order_date"])
 
-    # Calculate total amount
-    unit_price = float(r["selling_price"])
-    quantity = int(r["qty_ordered"])
-    total_amount = unit_price * quantity
-
+    line = _report_line(r)
     report = {
         "id": r["id"],
-        "product_id": r["product_id"],
-        "product_name": r["product_name"],
-        "unit_price": unit_price,
-        "quantity": quantity,
-        "total_amount": total_amount,
+        "title": "Order ID",
         "supplier_id": r["supplier_id"],
         "supplier_name": r["supplier_name"],
         "status": r["status"],
-        "date": date_long
+        "date": date_long,
+        "lines": [line],
+        "total_amount": line["total_amount"],
     }
 
     return render_template("reorder/order_report.html", report=report)
 
 
+def _report_line(r):
+    unit_price = float(r["selling_price"] or 0)
+    quantity = int(r["qty_ordered"])
+    return {
+        "product_id": r["product_id"],
+        "product_name": r["product_name"],
+        "unit_price": unit_price,
+        "quantity": quantity,
+        "total_amount": unit_price * quantity,
+    }
+
+
+# =======================================================
+# 📌 Purchase Order (one per supplier per engine run)
+# =======================================================
+@auto_order_bp.route("/po/<int:po_id>", methods=["GET"])
+def purchase_order_report(po_id):
+    conn = get_db()
+
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    cur.execute("""
+        SELECT
+            po.id,
+            po.supplier_id,
+            s.name AS supplier_name,
+            po.status,
+            po.created_at
+        FROM purchase_orders po
+        LEFT JOIN suppliers s ON po.supplier_id = s.id
+        WHERE po.id = %s;
+    """, (po_id,))
+    po = cur.fetchone()
+    if not po:
+        abort(404, description="Purchase order not found")
 
+    cur.execute("""
+        SELECT
+            o.product_id,
+            p.name AS product_name,
+            p.selling_price,
+            o.qty_ordered
+        FROM orders o
+        LEFT JOIN products p ON o.product_id = p.id
+        WHERE o.purchase_order_id = %s
+        ORDER BY o.product_id;
+    """, (po_id,))
+    lines = [_report_line(r) for r in cur.fetchall()]
+
+    report = {
+        "id": po["id"],
+        "title": "PO No",
+        "supplier_id": po["supplier_id"],
+        "supplier_name": po["supplier_name"],
+        "status": po["status"],
+        "date": po["created_at"].strftime("%d %b %Y %H:%M"),
+        "lines": lines,
+        "total_amount": sum(ln["total_amount"] for ln in lines),
+    }
+
+    return render_template("reorder/order_report.html", report=report)
@@ -1,47 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, session
 from datetime import datetime
 from app.db import get_db
+from app.kpi import get_dashboard_kpis
+from app.activity import fetch_recent_activities
 import psycopg2.extras
 
 main = Blueprint('main', __name__)
 
-# -------------------------
-# Helper: ensure activity table and logging
-# -------------------------
-def ensure_recent_activities_table(conn):
-    """Create recent_activities table if it doesn't exist."""
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS recent_activities (
-                id SERIAL PRIMARY KEY,
-                activity_text TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        cur.close()
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-
-def log_activity(conn, message):
-    """Insert a new activity row (safe: creates table if missing)."""
-    try:
-        ensure_recent_activities_table(conn)
-        cur = conn.cursor()
-        cur.execute("INSERT INTO recent_activities (activity_text) VALUES (%s);", (message,))
-        conn.commit()
-        cur.close()
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        # silent fail - activity logging should not break main flow
-
 # 🏠 Home
 @main.route('/')
 def index():
@@ -58,61 +23,13 @@ def dashboard():
     try:
         conn = get_db()
 
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-
-        # Total products
-        cur.execute("SELECT COUNT(*) FROM products;")
-        total_products = cur.fetchone()['count']
-
-        # Low stock products (using reorder_threshold)
-        # Fetch global minimum stock level (fixed number)
-        cur.execute("SELECT min_stock_level FROM auto_order_settings LIMIT 1;")
-        row = cur.fetchone()
-        min_stock_level = row['min_stock_level'] if row else 40  # default 40
-
-        # Low Stock Count (fixed rule)
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM products
-            WHERE stock_qty < %s;
-        """, (min_stock_level,))
-
-        low_stock = cur.fetchone()['count']
-
-        # Expiring soon 
-        cur.execute("""
-            SELECT COUNT(*) AS count
-            FROM alerts
-            WHERE alert_type = 'Expiry'
-            AND status = 'Active';
-        """)
-        expiring_soon = cur.fetchone()["count"]
-
-
-        # Monthly revenue (safe - set to 0 if null)
-        total_revenue = 0
-        try:
-            cur.execute("""
-                SELECT SUM(total_amount) AS total_revenue
-                FROM sales
-                WHERE DATE_TRUNC('month', sale_date) = DATE_TRUNC('month', CURRENT_DATE);
-            """)
-            tr = cur.fetchone()
-            total_revenue = tr['total_revenue'] or 0
-        except Exception:
-            total_revenue = 0
+        # All KPI figures in one round trip
+        kpis = get_dashboard_kpis(conn)
 
         # Fetch recent activities from DB (last 10)
         recent_activities = []
         try:
-            ensure_recent_activities_table(conn)
-            cur.execute("""
-                SELECT activity_text, created_at
-                FROM recent_activities
-                ORDER BY created_at DESC
-                LIMIT 10;
-            """)
-            rows = cur.fetchall()
+            rows = fetch_recent_activities(conn, limit=10)
             for r in rows:
                 activity_text = r['activity_text']
                 created_at = r['created_at']
@@ -131,6 +48,7 @@ def dashboard():
                     "time": created_at
                 })
         except Exception:
+            conn.rollback()
             # fallback to static messages if anything goes wrong
             recent_activities = [
                 {"icon": "📦", "message": "New product added — Organic Sugar", "time": None},
@@ -139,14 +57,12 @@ def dashboard():
                 {"icon": "⚠️", "message": "5 products nearing expiry this week", "time": None},
             ]
 
-        cur.close()
-
         return render_template(
             'dashboard.html',
-            total_products=total_products,
-            expiring_soon=expiring_soon,
-            low_stock=low_stock,
-            total_revenue=total_revenue,
+            total_products=kpis.total_products,
+            expiring_soon=kpis.expiring_soon,
+            low_stock=kpis.low_stock,
+            total_revenue=kpis.monthly_revenue,
             recent_activities=recent_activities
         )
 
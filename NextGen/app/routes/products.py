@@ -1,8 +1,22 @@
-from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for, send_file, make_response, Response, stream_with_context
+import os
+import tempfile
 import psycopg2.extras
-from datetime import datetime
-from app.routes.main import log_activity
+from datetime import datetime, date
+from app.activity import log_activity
 from app.db import get_db
+from app.kpi import get_dashboard_kpis, invalidate_kpis
+from app.billing import record_sale, normalize_items, checkout_many
+from app.stock import LIVE_STOCK_SQL, live_stock, receive_goods, ReceiptError
+from app.importer import import_file, ImportFileError
+from app.exports import EXPORTS, iter_csv
+from app.reorder import provision_rules
+from app.search import get_product_index, invalidate_product_index
+from app.catalog import fetch_catalog, parse_watermark
+from app.documents import (
+    fetch_bill_items, render_bill_pdf, cache_lookup, cache_store,
+    iter_bills_in_range, iter_rendered_bills, stream_bills_zip
+)
 products = Blueprint("products", __name__, url_prefix="/dashboard/products")
 
 # ---------------------------------------------------
@@ -13,70 +27,18 @@ def dashboard():
     try:
         conn = get_db()
 
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Total products
-        cur.execute("SELECT COUNT(*) FROM products;")
-        total_products = cur.fetchone()["count"]
-
-        # Global minimum stock level
-        cur.execute("SELECT min_stock_level FROM auto_order_settings LIMIT 1;")
-        row = cur.fetchone()
-        global_min_stock = int(row["min_stock_level"]) if row else 40
-
-        # Low stock
-        cur.execute("""
-            SELECT COUNT(*) FROM products
-            WHERE stock_qty < %s;
-        """, (global_min_stock,))
-        low_stock = cur.fetchone()["count"]
-
-        # Expiring soon 
-        cur.execute("""
-            SELECT COUNT(*) AS count
-            FROM alerts
-            WHERE alert_type = 'Expiry'
-            AND status = 'Active';
-        """)
-        expiring_soon = cur.fetchone()["count"]
-
-
-        # Total revenue
-        cur.execute("SELECT SUM(total_amount) AS revenue FROM sales;")
-        total_revenue = cur.fetchone()["revenue"] or 0
-
-        # Top selling products
-        cur.execute("""
-            SELECT p.name AS product_name,
-                   SUM(s.qty_sold) AS units_sold,
-                   SUM(s.total_amount) AS revenue
-            FROM sales s
-            JOIN products p ON s.product_id = p.id
-            GROUP BY p.name
-            ORDER BY revenue DESC
-            LIMIT 5;
-        """)
-        top_products = cur.fetchall()
-
-        # Suppliers
-        cur.execute("SELECT id, name FROM suppliers ORDER BY name;")
-        suppliers = cur.fetchall()
-
-        # ✅ PRODUCTS FOR INCREASE STOCK DROPDOWN
-        cur.execute("SELECT id, name FROM products ORDER BY name;")
-        products_list = cur.fetchall()
-
-        cur.close()
+        # KPIs + top sellers + dropdown lists in one round trip
+        kpis = get_dashboard_kpis(conn, with_catalog=True)
 
         return render_template(
             "product/product_dashboard.html",
-            total_products=total_products,
-            expiring_soon=expiring_soon,
-            low_stock=low_stock,
-            total_revenue=total_revenue,
-            top_products=top_products,
-            suppliers=suppliers,
-            products=products_list
+            total_products=kpis.total_products,
+            expiring_soon=kpis.expiring_soon,
+            low_stock=kpis.low_stock,
+            total_revenue=kpis.total_revenue,
+            top_products=kpis.top_products,
+            suppliers=kpis.suppliers,
+            products=kpis.products
         )
 
     except Exception as e:
@@ -102,12 +64,13 @@ def get_product(pid):
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     cur.execute("""
-        SELECT id,
-               name AS product_name,
-               stock_qty AS stock,
-               expiry_date
-        FROM products
-        WHERE id = %s
+        SELECT p.id,
+               p.name AS product_name,
+               ps.stock_qty AS stock,
+               p.expiry_date
+        FROM products p
+        JOIN product_stock ps ON ps.product_id = p.id
+        WHERE p.id = %s
     """, (pid,))
 
     product = cur.fetchone()
@@ -132,26 +95,92 @@ def increase_stock():
 
     cur = conn.cursor()
 
-    if expiry:
-        cur.execute("""
-            UPDATE products
-            SET stock_qty = stock_qty + %s,
-                expiry_date = %s
-            WHERE id = %s
-        """, (qty, expiry, pid))
-    else:
-        cur.execute("""
-            UPDATE products
-            SET stock_qty = stock_qty + %s
-            WHERE id = %s
-        """, (qty, pid))
+    try:
+        receive_goods(cur, [{"product_id": pid, "qty": qty, "expiry_date": expiry, "batch_id": None}])
+    except ReceiptError as e:
+        conn.rollback()
+        cur.close()
+        return jsonify({"error": str(e)}), 404
 
+    invalidate_kpis(conn)
+    invalidate_product_index(conn)
     conn.commit()
     cur.close()
 
-    log_activity(conn, f"Stock increased for product ID {pid}")
+    log_activity(f"Stock increased for product ID {pid}")
     return jsonify({"status": "success"})
 
+# ---------------------------------------------------
+# GOODS RECEIPT (many lines, one transaction)
+# ---------------------------------------------------
+MAX_RECEIPT_LINES = 5000
+
+
+@products.route("/receive", methods=["POST"])
+def receive_stock():
+    """
+    {"ref": "GRN-42", "purchase_order_id": 7,
+     "lines": [{"product_id", "qty", "expiry_date", "batch_id"}, ...]}
+    All lines are booked or none are. purchase_order_id (optional) books
+    the delivery against an open purchase order.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_lines = data.get("lines") or []
+    ref = data.get("ref") or None
+    try:
+        po_id = int(data["purchase_order_id"]) if data.get("purchase_order_id") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid purchase_order_id"}), 400
+
+    if not raw_lines:
+        return jsonify({"error": "no lines"}), 400
+    if len(raw_lines) > MAX_RECEIPT_LINES:
+        return jsonify({"error": f"at most {MAX_RECEIPT_LINES} lines per receipt"}), 400
+
+    lines = []
+    for i, ln in enumerate(raw_lines):
+        try:
+            qty = int(ln.get("qty", 0))
+            expiry = ln.get("expiry_date")
+            batch_id = ln.get("batch_id")
+            lines.append({
+                "product_id": int(ln.get("product_id")),
+                "qty": qty,
+                "expiry_date": date.fromisoformat(expiry) if expiry else None,
+                "batch_id": int(batch_id) if batch_id is not None else None
+            })
+        except (TypeError, ValueError):
+            return jsonify({"error": f"line {i}: invalid product_id/qty/expiry_date/batch_id"}), 400
+        if qty <= 0:
+            return jsonify({"error": f"line {i}: qty must be positive"}), 400
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    try:
+        summary = receive_goods(cur, lines, ref=ref, purchase_order_id=po_id)
+
+        invalidate_kpis(conn)
+        invalidate_product_index(conn)
+        conn.commit()
+
+    except ReceiptError as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        cur.close()
+
+    log_activity(
+        f"Goods received{f' ({ref})' if ref else ''} — "
+        f"{summary['units']} units across {summary['products']} products"
+    )
+    return jsonify({"status": "success", **summary})
+
 # ---------------------------------------------------
 # ADD CATEGORY (UI helper only)
 # ---------------------------------------------------
@@ -188,41 +217,120 @@ def get_categories():
 # ---------------------------------------------------
 # VIEW ALL PRODUCTS
 # ---------------------------------------------------
+PRODUCT_LIST_PAGE_SIZE = 50
+
+# sort -> keyset column; each pair (key, p.id) has a btree index (migration 9)
+_PRODUCT_SORT_KEYS = {
+    "id": None,
+    "category": "COALESCE(p.category, '')",
+    "supplier": "COALESCE(p.supplier_id, 0)",
+}
+
+
 @products.route("/view")
 def view_products():
+    """
+    One page of products, keyset-paginated on (sort key, p.id): the
+    "Next" link carries the last row's key as ?after_key=&after=.
+    Filters: ?search= (trigram-indexed), ?category=, ?supplier_id=.
+    """
+    search = request.args.get("search", "").strip().lower()
+    category = request.args.get("category") or None
+    sort = request.args.get("sort", "id")
+    if sort not in _PRODUCT_SORT_KEYS:
+        sort = "id"
+
+    try:
+        supplier_id = request.args.get("supplier_id", type=int)
+        after = request.args.get("after", type=int)
+        after_key = request.args.get("after_key")
+        if sort == "supplier" and after_key is not None:
+            after_key = int(after_key)
+    except ValueError:
+        return "Invalid supplier_id / after / after_key", 400
+
+    # a keyed sort needs both halves of the cursor, or we'd restart at page 1
+    if _PRODUCT_SORT_KEYS[sort] is not None and (after is None) != (after_key is None):
+        return "Incomplete cursor: pass both after and after_key", 400
+
     conn = get_db()
 
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    search = request.args.get("search", "").lower()
+    key = _PRODUCT_SORT_KEYS[sort]
+    where = []
+    params = {"limit": PRODUCT_LIST_PAGE_SIZE}
 
-    sql = """
-        SELECT 
+    if search:
+        where.append("LOWER(p.name) LIKE %(search)s")
+        params["search"] = f"%{search}%"
+    if category:
+        where.append("p.category = %(category)s")
+        params["category"] = category
+    if supplier_id is not None:
+        where.append("p.supplier_id = %(supplier_id)s")
+        params["supplier_id"] = supplier_id
+
+    if after is not None:
+        params["after"] = after
+        if key is None:
+            where.append("p.id > %(after)s")
+        else:
+            where.append(f"({key}, p.id) > (%(after_key)s, %(after)s)")
+            params["after_key"] = after_key
+
+    order = "p.id" if key is None else f"{key}, p.id"
+
+    cur.execute(f"""
+        SELECT
             p.id,
             p.name,
             p.category,
-            p.stock_qty,
+            p.supplier_id,
+            {LIVE_STOCK_SQL} AS stock_qty,
             s.name AS supplier,
             p.selling_price,
             p.updated_at
         FROM products p
         LEFT JOIN suppliers s ON p.supplier_id = s.id
-    """
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY {order}
+        LIMIT %(limit)s;
+    """, params)
+    products_list = cur.fetchall()
 
-    if search:
-        sql += " WHERE LOWER(p.name) LIKE %s ORDER BY p.id;"
-        cur.execute(sql, (f"%{search}%",))
-    else:
-        sql += " ORDER BY p.id;"
-        cur.execute(sql)
+    cur.execute("""
+        SELECT DISTINCT category
+        FROM products
+        WHERE category IS NOT NULL
+        ORDER BY category;
+    """)
+    categories = [row["category"] for row in cur.fetchall()]
 
-    products_list = cur.fetchall()
+    cur.execute("SELECT id, name FROM suppliers ORDER BY name;")
+    suppliers = cur.fetchall()
     cur.close()
 
+    next_page = None
+    if len(products_list) == PRODUCT_LIST_PAGE_SIZE:
+        last = products_list[-1]
+        next_page = {"after": last["id"]}
+        if sort == "category":
+            next_page["after_key"] = last["category"] or ""
+        elif sort == "supplier":
+            next_page["after_key"] = last["supplier_id"] or 0
+
     return render_template(
         "product/view_products.html",
         products=products_list,
-        search=search
+        search=search,
+        category=category,
+        supplier_id=supplier_id,
+        sort=sort,
+        categories=categories,
+        suppliers=suppliers,
+        next_page=next_page,
+        paged=after is not None
     )
 
 
@@ -250,10 +358,13 @@ def add_product():
     """, (name, category, stock, selling_price, supplier_id, expiry))
 
     pid = cur.fetchone()["id"]
+    provision_rules(cur, [pid])     # so the reorder page can toggle it right away
+    invalidate_kpis(conn)
+    invalidate_product_index(conn)
     conn.commit()
     cur.close()
 
-    log_activity(conn, f"New product added — {name}")
+    log_activity(f"New product added — {name}")
     flash("✅ Product added successfully!", "success")
     return redirect(url_for("products.view_products"))
 
@@ -268,10 +379,12 @@ def remove_product(product_id):
 
     cur = conn.cursor()
     cur.execute("DELETE FROM products WHERE id=%s;", (product_id,))
+    invalidate_kpis(conn)
+    invalidate_product_index(conn)
     conn.commit()
     cur.close()
 
-    log_activity(conn, f"Product removed — ID {product_id}")
+    log_activity(f"Product removed — ID {product_id}")
     flash("🗑️ Product removed!", "info")
     return redirect(url_for("products.view_products"))
 
@@ -316,9 +429,10 @@ def add_supplier():
             """, (name, contact, address, lead))
 
         new_id = cur.fetchone()["id"]
+        invalidate_kpis(conn)   # cached payload carries the supplier dropdown
         conn.commit()
 
-        log_activity(conn, f"Supplier added — {name}")
+        log_activity(f"Supplier added — {name}")
 
         return jsonify({"message": "Supplier added", "id": new_id})
 
@@ -326,59 +440,104 @@ def add_supplier():
         conn.rollback()
         return jsonify({"error": str(e)}), 500
 
+# ---------------------------------------------------
+# BULK IMPORT (CSV / XLSX via COPY)
+# ---------------------------------------------------
+@products.route("/import", methods=["POST"])
+def import_data():
+    kind = request.form.get("kind", "products")
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "file required"}), 400
+
+    suffix = os.path.splitext(upload.filename)[1].lower()
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+
+    try:
+        upload.save(path)
+        report = import_file(get_db(), kind, path)
+    except ImportFileError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        os.remove(path)
+
+    log_activity(f"Imported {kind} — {report.rows_read} rows from {upload.filename}")
+    return jsonify(report.as_dict())
+
+# ---------------------------------------------------
+# STREAMING CSV EXPORT (products / sales / orders)
+# ---------------------------------------------------
+@products.route("/export/<kind>.csv")
+def export_csv(kind):
+    if kind not in EXPORTS:
+        return jsonify({"error": f"unknown export {kind}"}), 404
+
+    try:
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+
+    category = request.args.get("category") or None
+    chunks = iter_csv(get_db(), kind, date_from=date_from, date_to=date_to, category=category)
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={kind}.csv"}
+    )
+
 # -----------------------------------------------------------
 # BILLING SYSTEM
 # -----------------------------------------------------------
 @products.route("/billing")
 def billing_page():
-    try:
-        conn = get_db()
-
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        cur.execute("SELECT id, name, selling_price, stock_qty FROM products ORDER BY name;")
-        products_list = cur.fetchall()
-        cur.close()
+    # Products are no longer embedded here: billing.js keeps its own
+    # catalogue copy in browser storage and syncs deltas from /billing/catalog
+    return render_template("product/billing.html")
 
-        return render_template("product/billing.html", products=products_list)
+@products.route("/billing/catalog")
+def billing_catalog():
+    try:
+        since = parse_watermark(request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "since must be an ISO timestamp"}), 400
 
+    try:
+        return jsonify(fetch_catalog(get_db(), since))
     except Exception as e:
-        return render_template("product/billing.html", products=[])
+        return jsonify({"error": str(e)}), 500
 
 @products.route("/billing/search")
 def billing_search():
     q = request.args.get("q", "").strip()
-    conn = get_db()
-
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
     try:
-        if q.isdigit():
-            cur.execute("""
-                SELECT id, name, selling_price, stock_qty 
-                FROM products 
-                WHERE id = %s
-            """, (int(q),))
-        else:
-            cur.execute("""
-                SELECT id, name, selling_price, stock_qty
-                FROM products 
-                WHERE LOWER(name) LIKE %s
-            """, (f"%{q.lower()}%",))
+        limit = min(int(request.args.get("limit", 20)), 50)
+    except ValueError:
+        limit = 20
 
-        rows = cur.fetchall()
-        return jsonify(rows)
+    try:
+        # Matched from this worker's in-memory index (see app/search.py);
+        # stock is read live for just the results
+        conn = get_db()
+        results = get_product_index(conn).search(q, limit=limit)
+        if results:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            stock = live_stock(cur, [r["id"] for r in results])
+            cur.close()
+            results = [{**r, "stock_qty": stock.get(r["id"], r["stock_qty"])} for r in results]
+        return jsonify(results)
 
     except Exception:
         return jsonify([])
 
-    finally:
-        cur.close()
-
 @products.route("/billing/checkout", methods=["POST"])
 def billing_checkout():
-    from datetime import datetime
-
     data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "missing payload"}), 400
@@ -389,96 +548,83 @@ def billing_checkout():
     if not items:
         return jsonify({"error": "no items"}), 400
 
+    try:
+        normalized_items = normalize_items(items)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db()
 
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        today = datetime.now().strftime("%Y%m%d")
-        like_pattern = f"BILL-{today}-%"
-
-        cur.execute("""
-            SELECT bill_no 
-            FROM sales 
-            WHERE bill_no LIKE %s 
-            ORDER BY id DESC 
-            LIMIT 1
-        """, (like_pattern,))
-
-        row = cur.fetchone()
+        # Set-based: constant round trips regardless of cart size. The bill
+        # number is allocated inside, only once the cart is valid.
+        bill_no, sale_ids = record_sale(cur, normalized_items, biller_id)
 
-        if row and row.get("bill_no"):
-            try:
-                last_num = int(row["bill_no"].split("-")[-1])
-                next_seq = last_num + 1
-            except:
-                next_seq = 1
-        else:
-            next_seq = 1
-
-        bill_no = f"BILL-{today}-{next_seq:04d}"
-
-        sale_ids = []
-        normalized_items = []
-
-        for it in items:
-            pid = int(it.get("product_id"))
-            qty = int(it.get("qty", 0))
-            unit_price = float(it.get("unit_price", 0))
-
-            if qty <= 0:
-                return jsonify({"error": f"Invalid qty for product {pid}"}), 400
-
-            normalized_items.append({
-                "product_id": pid,
-                "qty": qty,
-                "unit_price": unit_price,
-                "batch_id": it.get("batch_id")
-            })
-
-        for it in normalized_items:
-            cur.execute("SELECT stock_qty FROM products WHERE id=%s FOR UPDATE", (it["product_id"],))
-            row = cur.fetchone()
-
-            if not row:
-                raise Exception(f"Product {it['product_id']} not found")
+        # 🚫 REMOVED: BILL LOG ENTRY
+        # No bill logs will appear in recent_activities now.
 
-            available = row["stock_qty"] or 0
-            if it["qty"] > available:
-                raise Exception(f"Insufficient stock for product {it['product_id']}")
+        invalidate_kpis(conn)
+        conn.commit()
+        return jsonify({"message": "success", "bill_no": bill_no, "sale_ids": sale_ids})
 
-            if it["batch_id"]:
-                cur.execute("SELECT batch_qty FROM batches WHERE id=%s FOR_UPDATE", (it["batch_id"],))
-                b = cur.fetchone()
-                if not b or it["qty"] > (b["batch_qty"] or 0):
-                    raise Exception(f"Insufficient batch qty {it['batch_id']}")
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
 
-        for it in normalized_items:
-            total = it["qty"] * it["unit_price"]
+    finally:
+        cur.close()
 
-            cur.execute("""
-                INSERT INTO sales 
-                    (product_id, batch_id, qty_sold, sale_date, total_amount, biller_id, bill_no)
-                VALUES 
-                    (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s)
-                RETURNING id;
-            """, (it["product_id"], it["batch_id"], it["qty"], total, biller_id, bill_no))
+# -----------------------------------------------------------
+# BULK CHECKOUT (offline till resync, idempotent)
+# -----------------------------------------------------------
+MAX_BULK_CARTS = 200
 
-            sid = cur.fetchone()["id"]
-            sale_ids.append(sid)
 
-            cur.execute("UPDATE products SET stock_qty = stock_qty - %s WHERE id = %s",
-                        (it["qty"], it["product_id"]))
+@products.route("/billing/checkout/bulk", methods=["POST"])
+def billing_checkout_bulk():
+    """
+    {"carts": [{"idempotency_key": "...", "items": [...], "biller_id": 1}, ...]}
+    One transaction for the whole batch. A key that was already billed
+    comes back as "replayed" with its original bill_no.
+    """
+    data = request.get_json(silent=True)
+    if not data or not data.get("carts"):
+        return jsonify({"error": "no carts"}), 400
+
+    if len(data["carts"]) > MAX_BULK_CARTS:
+        return jsonify({"error": f"at most {MAX_BULK_CARTS} carts per request"}), 400
+
+    carts = []
+    keys = set()
+    for i, cart in enumerate(data["carts"]):
+        key = cart.get("idempotency_key")
+        if not isinstance(key, str) or not key or len(key) > 200:
+            return jsonify({"error": f"cart {i}: idempotency_key required"}), 400
+        if key in keys:
+            return jsonify({"error": f"cart {i}: duplicate idempotency_key {key}"}), 400
+        keys.add(key)
+
+        if not cart.get("items"):
+            return jsonify({"error": f"cart {i}: no items"}), 400
+        try:
+            items = normalize_items(cart["items"])
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"cart {i}: {e}"}), 400
+
+        carts.append({"key": key, "items": items, "biller_id": cart.get("biller_id", 1)})
 
-            if it["batch_id"]:
-                cur.execute("UPDATE batches SET batch_qty = batch_qty - %s WHERE id = %s",
-                            (it["qty"], it["batch_id"]))
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # 🚫 REMOVED: BILL LOG ENTRY
-        # No bill logs will appear in recent_activities now.
+    try:
+        results = checkout_many(cur, carts)
 
+        if any(r["status"] == "created" for r in results):
+            invalidate_kpis(conn)
         conn.commit()
-        return jsonify({"message": "success", "bill_no": bill_no, "sale_ids": sale_ids})
+        return jsonify({"results": results})
 
     except Exception as e:
         conn.rollback()
@@ -492,22 +638,29 @@ def billing_checkout():
 # -----------------------------------------------------------
 @products.route("/billing/history")
 def billing_history():
+    """
+    Latest bills, newest first. Keyset-paginated: pass the last row's
+    created_at and bill_no as ?before=<created_at>&before_bill=<bill_no>.
+    """
+    before = request.args.get("before")
+    before_bill = request.args.get("before_bill")
+    try:
+        limit = min(int(request.args.get("limit", 50)), 200)
+    except ValueError:
+        limit = 50
+
     try:
         conn = get_db()
 
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute("""
-            SELECT
-                bill_no,
-                MIN(sale_date) AS created_at,
-                SUM(total_amount) AS net_amount,
-                COUNT(*) AS item_count
-            FROM sales
-            WHERE bill_no IS NOT NULL
-            GROUP BY bill_no
-            ORDER BY created_at DESC
-            LIMIT 50;
-        """)
+            SELECT bill_no, created_at, net_amount, item_count
+            FROM bills
+            WHERE %(before)s::timestamp IS NULL
+               OR (created_at, bill_no) < (%(before)s::timestamp, %(before_bill)s)
+            ORDER BY created_at DESC, bill_no DESC
+            LIMIT %(limit)s;
+        """, {"before": before, "before_bill": before_bill or "", "limit": limit})
         rows = cur.fetchall()
         cur.close()
         for r in rows:
@@ -517,40 +670,72 @@ def billing_history():
     except:
         return jsonify([]), 500
 
-@products.route("/billing/print/<string:bill_no>")
-def billing_print(bill_no):
-    try:
-        conn = get_db()
+# Bills are immutable: renders are cached on disk and revalidated by ETag
+BILL_CACHE_CONTROL = "private, max-age=31536000, immutable"
 
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cur.execute("""
-            SELECT 
-                p.name AS product_name,
-                s.qty_sold,
-                s.total_amount,
-                s.sale_date,
-                COALESCE(s.biller_id, 1) AS biller_id
-            FROM sales s
-            LEFT JOIN products p ON s.product_id = p.id
-            WHERE s.bill_no = %s
-            ORDER BY s.id;
-        """, (bill_no,))
-
-        items = cur.fetchall()
-        cur.close()
+def _send_bill_document(path, etag, data, mimetype, download_name=None):
+    if path:
+        resp = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=download_name is not None,
+            download_name=download_name,
+            etag=etag,
+            conditional=True
+        )
+    else:
+        resp = make_response(data)
+        resp.mimetype = mimetype
+        resp.set_etag(etag)
+        if download_name:
+            resp.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+        resp = resp.make_conditional(request)
 
-        if not items:
-            return "Bill not found", 404
+    resp.headers["Cache-Control"] = BILL_CACHE_CONTROL
+    return resp
 
-        total = sum(float(i["total_amount"]) for i in items)
 
-        return render_template(
+def _render_bill_document(bill_no, kind):
+    """Return (path, etag, data) for a bill render, rendering + caching on a miss; None if no such bill."""
+    hit = cache_lookup(bill_no, kind)
+    if hit:
+        return hit[0], hit[1], None
+
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    items = fetch_bill_items(cur, bill_no)
+    cur.close()
+
+    if not items:
+        return None
+
+    if kind == "pdf":
+        data = render_bill_pdf(bill_no, items)
+        ext = "pdf"
+    else:
+        total = sum(float(i["total_amount"]) for i in items)
+        data = render_template(
             "product/bill_print.html",
             bill_no=bill_no,
             items=items,
             total=total
-        )
+        ).encode("utf-8")
+        ext = "html"
+
+    path, etag = cache_store(bill_no, kind, ext, data)
+    return path, etag, data
+
+
+@products.route("/billing/print/<string:bill_no>")
+def billing_print(bill_no):
+    try:
+        doc = _render_bill_document(bill_no, "print")
+        if doc is None:
+            return "Bill not found", 404
+
+        path, etag, data = doc
+        return _send_bill_document(path, etag, data, "text/html")
 
     except Exception as e:
         return f"Error: {e}", 500
@@ -559,140 +744,37 @@ def billing_print(bill_no):
 @products.route("/billing/pdf/<string:bill_no>")
 def billing_pdf(bill_no):
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import mm
-        from flask import make_response
-        import io
-        import psycopg2.extras
+        doc = _render_bill_document(bill_no, "pdf")
+        if doc is None:
+            return "Bill not found", 404
 
-        conn = get_db()
+        path, etag, data = doc
+        return _send_bill_document(
+            path, etag, data, "application/pdf",
+            download_name=f"{bill_no}.pdf"
+        )
 
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    except Exception as e:
+        return f"PDF Error: {e}", 500
 
-        cur.execute("""
-            SELECT 
-                s.product_id,
-                p.name AS product_name,
-                s.qty_sold,
-                s.total_amount,
-                s.sale_date,
-                s.biller_id
-            FROM sales s
-            LEFT JOIN products p ON s.product_id = p.id
-            WHERE s.bill_no = %s
-            ORDER BY s.id;
-        """, (bill_no,))
-        items = cur.fetchall()
-        cur.close()
 
-        if not items:
-            return "Bill not found", 404
+# -----------------------------------------------------------
+# BULK BILL EXPORT (ZIP of PDFs for a date range)
+# -----------------------------------------------------------
+@products.route("/billing/export")
+def billing_export():
+    try:
+        date_from = date.fromisoformat(request.args["from"])
+        date_to = date.fromisoformat(request.args.get("to") or request.args["from"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "from (and optional to) must be YYYY-MM-DD"}), 400
 
-        # -----------------------------
-        # CALCULATIONS
-        # -----------------------------
-        total = sum(float(i["total_amount"]) for i in items)
-        gst = round(total * 0.18, 2)
-        grand_total = round(total + gst, 2)
-
-        # -----------------------------
-        # PDF SETUP
-        # -----------------------------
-        buffer = io.BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=A4)
-
-        x_left = 20 * mm
-        y = 280 * mm
-
-        # -----------------------------
-        # HEADER
-        # -----------------------------
-        pdf.setFont("Helvetica-Bold", 22)
-        pdf.drawString(x_left, y, "NXT GEN Inventory")
-
-        pdf.setFont("Helvetica", 11)
-        y -= 10 * mm
-        pdf.drawString(x_left, y, "Bengaluru – 560003")
-        y -= 6 * mm
-        pdf.drawString(x_left, y, "Phone: +91 3121030103")
-        y -= 6 * mm
-        pdf.drawString(x_left, y, "GSTIN: 29CYCM2314CT17")
-
-        y -= 8 * mm
-        pdf.line(x_left, y, 190 * mm, y)
-        y -= 10 * mm
-
-        # -----------------------------
-        # BILL INFO
-        # -----------------------------
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(x_left, y, f"Bill No: {bill_no}")
-        y -= 7 * mm
-
-        pdf.drawString(x_left, y, f"Date: {items[0]['sale_date']}")
-        y -= 7 * mm
-
-        pdf.drawString(x_left, y, f"Biller ID: {items[0]['biller_id']}")
-        y -= 10 * mm
-
-        # -----------------------------
-        # TABLE HEADER
-        # -----------------------------
-        pdf.setFont("Helvetica-Bold", 13)
-        pdf.drawString(x_left, y, "Product")
-        pdf.drawString(100 * mm, y, "Qty")
-        pdf.drawString(130 * mm, y, "Price")
-        pdf.drawString(160 * mm, y, "Total")
-
-        y -= 6 * mm
-        pdf.line(x_left, y, 190 * mm, y)
-        y -= 8 * mm
-
-        # -----------------------------
-        # TABLE ROWS
-        # -----------------------------
-        pdf.setFont("Helvetica", 12)
-
-        for it in items:
-            price_per_unit = float(it["total_amount"]) / int(it["qty_sold"])
-
-            pdf.drawString(x_left, y, it["product_name"])
-            pdf.drawString(100 * mm, y, str(it["qty_sold"]))
-            pdf.drawString(130 * mm, y, f"Rs. {price_per_unit:.2f}")
-            pdf.drawString(160 * mm, y, f"Rs. {it['total_amount']:.2f}")
-
-            y -= 7 * mm
-
-        # -----------------------------
-        # TOTALS
-        # -----------------------------
-        y -= 5 * mm
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(x_left, y, f"Subtotal: Rs. {total:.2f}")
-        y -= 7 * mm
-
-        pdf.drawString(x_left, y, f"GST (18%): Rs. {gst:.2f}")
-        y -= 7 * mm
-
-        pdf.drawString(x_left, y, f"Grand Total: Rs. {grand_total:.2f}")
-        y -= 15 * mm
-
-        # -----------------------------
-        # FOOTER
-        # -----------------------------
-        pdf.setFont("Helvetica-Oblique", 12)
-        pdf.drawString(x_left, y, "Thank you for shopping with NXT GEN Inventory!")
-
-        pdf.showPage()
-        pdf.save()
-
-        buffer.seek(0)
-        response = make_response(buffer.read())
-        response.headers["Content-Type"] = "application/pdf"
-        response.headers["Content-Disposition"] = f"attachment; filename={bill_no}.pdf"
-
-        return response
+    conn = get_db()
+    bills = iter_bills_in_range(conn, date_from, date_to)
+    chunks = stream_bills_zip(iter_rendered_bills(bills))
 
-    except Exception as e:
-        return f"PDF Error: {e}", 500
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=bills_{date_from}_{date_to}.zip"}
+    )
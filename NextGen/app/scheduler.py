@@ -0,0 +1,92 @@
+# NextGen/app/scheduler.py
+# Tiny in-process job scheduler for periodic maintenance (pruning,
+# refreshes, ...). Every gunicorn worker runs the loop, but each job run
+# is guarded by a Postgres advisory lock so only one worker executes it.
+
+import logging
+import os
+import threading
+import time
+from app.db import connect
+
+log = logging.getLogger(__name__)
+
+_jobs = {}            # name -> {"interval": seconds, "func": f(conn), "next_run": monotonic}
+_jobs_lock = threading.Lock()
+_scheduler_pid = None
+
+
+def register_job(name, interval, func):
+    """Run func(conn) every `interval` seconds; the scheduler commits after func returns."""
+    with _jobs_lock:
+        _jobs[name] = {"interval": interval, "func": func, "next_run": time.monotonic() + interval}
+
+
+def job(name, interval):
+    """Decorator form of register_job."""
+    def wrap(func):
+        register_job(name, interval, func)
+        return func
+    return wrap
+
+
+def job_names():
+    with _jobs_lock:
+        return sorted(_jobs)
+
+
+def run_job(name):
+    """
+    Run one job now (CLI / tests). Returns False if another worker holds
+    its lock, True once it has run and committed.
+    """
+    func = _jobs[name]["func"]
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s)) AS locked;", (f"ngim:job:{name}",))
+        if not cur.fetchone()["locked"]:
+            conn.rollback()
+            return False
+        try:
+            func(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s));", (f"ngim:job:{name}",))
+            conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def _loop():
+    while True:
+        now = time.monotonic()
+        with _jobs_lock:
+            due = [n for n, j in _jobs.items() if j["next_run"] <= now]
+            for n in due:
+                _jobs[n]["next_run"] = now + _jobs[n]["interval"]
+
+        for name in due:
+            try:
+                run_job(name)
+            except Exception:
+                log.exception("scheduled job %s failed", name)
+
+        time.sleep(1)
+
+
+def start_scheduler():
+    """Start the scheduler thread once per process (safe to call on every request)."""
+    global _scheduler_pid
+    pid = os.getpid()
+    if _scheduler_pid == pid:
+        return
+    with _jobs_lock:
+        if _scheduler_pid == pid:
+            return
+        _scheduler_pid = pid
+    threading.Thread(target=_loop, name="ngim-scheduler", daemon=True).start()
@@ -0,0 +1,143 @@
+# NextGen/app/search.py
+# Per-worker product search index for the billing typeahead.
+#
+# Built from one SELECT over products and kept in memory:
+#   - token prefix postings  ("bas" -> ids of "Basmati Rice", ...)
+#   - trigram postings       (substring + fuzzy matches, like LIKE '%q%')
+# Writes that change the catalogue (names, prices, adds, deletes) call
+# invalidate_product_index(conn); a NOTIFY makes every worker rebuild
+# lazily on its next search. Stock movements don't: the stock_qty kept
+# here is only a fallback, and /billing/search overlays live stock on
+# the handful of results it returns (stock.live_stock).
+
+import re
+import threading
+import time
+from collections import defaultdict
+import psycopg2.extras
+from app.config import Config
+from app.notify import ensure_listener, notify, subscribe
+
+PRODUCTS_CHANNEL = "ngim_products_changed"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(text):
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+
+    def __init__(self, rows):
+        self.products = {}                     # id -> row dict
+        self.names = {}                        # id -> lowercased name
+        self.prefixes = defaultdict(set)       # token prefix -> ids
+        self.trigrams = defaultdict(set)       # trigram -> ids
+
+        for r in rows:
+            pid = r["id"]
+            name = r["name"] or ""
+            self.products[pid] = r
+            self.names[pid] = name.lower()
+            for tok in _tokens(name):
+                for i in range(1, len(tok) + 1):
+                    self.prefixes[tok[:i]].add(pid)
+            for tri in _trigrams(name):
+                self.trigrams[tri].add(pid)
+
+    def search(self, q, limit=20):
+        q = q.strip().lower()
+        if not q:
+            return []
+
+        # Exact id / scanned code
+        if q.isdigit() and int(q) in self.products:
+            return [self.products[int(q)]]
+
+        scores = {}
+
+        # 1️⃣ Every query token is a prefix of some name token
+        q_tokens = _tokens(q)
+        if q_tokens:
+            hits = set.intersection(*(self.prefixes.get(t, set()) for t in q_tokens))
+            for pid in hits:
+                name = self.names[pid]
+                if name == q:
+                    scores[pid] = 4.0
+                elif name.startswith(q):
+                    scores[pid] = 3.0
+                else:
+                    scores[pid] = 2.0
+
+        # 2️⃣ Substring / fuzzy via trigrams
+        if len(scores) < limit and len(q) >= 3:
+            q_tris = _trigrams(q)
+            counts = defaultdict(int)
+            for tri in q_tris:
+                for pid in self.trigrams.get(tri, ()):
+                    counts[pid] += 1
+            for pid, shared in counts.items():
+                if pid in scores:
+                    continue
+                if q in self.names[pid]:
+                    scores[pid] = 1.5
+                else:
+                    similarity = shared / len(q_tris)
+                    if similarity >= 0.5:
+                        scores[pid] = similarity
+
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], self.names[pid]))
+        return [self.products[pid] for pid in ranked[:limit]]
+
+
+# ----------------------------
+# Per-worker instance
+# ----------------------------
+_index = None
+_built_at = 0.0
+_dirty = True
+_lock = threading.Lock()
+
+
+def _mark_dirty(payload=None):
+    global _dirty
+    _dirty = True
+
+
+subscribe(PRODUCTS_CHANNEL, _mark_dirty)
+
+
+def invalidate_product_index(conn):
+    """Call inside the write transaction that changes products; workers rebuild after commit."""
+    _mark_dirty()
+    notify(conn, PRODUCTS_CHANNEL)
+
+
+def get_product_index(conn):
+    global _index, _built_at, _dirty
+    ensure_listener()
+
+    if _index is not None and not _dirty and time.monotonic() - _built_at < Config.SEARCH_INDEX_TTL:
+        return _index
+
+    with _lock:
+        if _index is None or _dirty or time.monotonic() - _built_at >= Config.SEARCH_INDEX_TTL:
+            _dirty = False       # a NOTIFY landing during the build marks it dirty again
+            try:
+                cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+                cur.execute("SELECT id, name, selling_price, stock_qty FROM products;")
+                rows = cur.fetchall()
+                cur.close()
+            except Exception:
+                _dirty = True
+                raise
+            _index = ProductSearchIndex(rows)
+            _built_at = time.monotonic()
+
+    return _index
@@ -2,7 +2,6 @@
 // FIXED BILLING.JS — CORRECT BLUEPRINT ROUTES
 // =====================================================
 
-let products = window.__INITIAL_PRODUCTS || [];
 let cart = {};
 
 const searchBox = document.getElementById("searchBox");
@@ -14,16 +13,100 @@ const checkoutBtn = document.getElementById("checkoutBtn");
 // Base route for all calls
 const BASE = "/dashboard/products/billing";
 
+// =====================================================
+// CATALOGUE CACHE (browser storage + delta sync)
+// =====================================================
+// Full download once per till, then only rows changed since the last
+// watermark (deleted products arrive as tombstone ids).
+const CATALOG_KEY = "ngim.catalog.v1";
+const CATALOG_SYNC_MS = 60 * 1000;
+
+let catalog = loadCatalog();
+
+function loadCatalog() {
+    try {
+        const saved = JSON.parse(localStorage.getItem(CATALOG_KEY));
+        if (saved && saved.products) return saved;
+    } catch (e) { /* corrupt or unavailable storage: start over */ }
+    return { watermark: null, products: {} };
+}
+
+function saveCatalog() {
+    try {
+        localStorage.setItem(CATALOG_KEY, JSON.stringify(catalog));
+    } catch (e) { /* quota exceeded: keep the in-memory copy */ }
+}
+
+function syncCatalog() {
+    const since = catalog.watermark ? `?since=${encodeURIComponent(catalog.watermark)}` : "";
+
+    return fetch(`${BASE}/catalog${since}`)
+        .then(r => r.json())
+        .then(delta => {
+            if (delta.error) throw new Error(delta.error);
+
+            if (delta.full) catalog.products = {};
+            delta.products.forEach(p => { catalog.products[p.id] = p; });
+            delta.deleted.forEach(id => { delete catalog.products[id]; });
+            catalog.watermark = delta.watermark;
+            saveCatalog();
+        })
+        .catch(err => console.error("Catalogue sync failed:", err));
+}
+
+function catalogReady() {
+    return catalog.watermark !== null;
+}
+
+function searchCatalog(q, limit = 20) {
+    if (/^\d+$/.test(q) && catalog.products[q]) return [catalog.products[q]];
+
+    const ranked = [];
+    Object.values(catalog.products).forEach(p => {
+        const name = (p.name || "").toLowerCase();
+        const pos = name.indexOf(q);
+        if (pos === -1) return;
+        const rank = name === q ? 0 : pos === 0 ? 1 : name.includes(" " + q) ? 2 : 3;
+        ranked.push([rank, name, p]);
+    });
+
+    ranked.sort((a, b) => a[0] - b[0] || a[1].localeCompare(b[1]));
+    return ranked.slice(0, limit).map(r => r[2]);
+}
+
+syncCatalog();
+setInterval(syncCatalog, CATALOG_SYNC_MS);
+
 // =====================================================
 // SEARCH
 // =====================================================
+// Debounced: one request per typing pause; a newer query aborts the
+// request still in flight so stale results never overwrite fresh ones.
+const SEARCH_DEBOUNCE_MS = 150;
+let searchTimer = null;
+let searchController = null;
+
 searchBox.addEventListener("input", () => {
+    clearTimeout(searchTimer);
+    if (searchController) searchController.abort();
+
     let q = searchBox.value.trim().toLowerCase();
     if (!q) return (resultBox.innerHTML = "");
 
-    fetch(`${BASE}/search?q=${q}`)
-        .then(r => r.json())
-        .then(showSearchResults);
+    // Local catalogue answers instantly; the server is only a fallback
+    // until the first sync has completed.
+    if (catalogReady()) return showSearchResults(searchCatalog(q));
+
+    searchTimer = setTimeout(() => {
+        searchController = new AbortController();
+
+        fetch(`${BASE}/search?q=${encodeURIComponent(q)}`, { signal: searchController.signal })
+            .then(r => r.json())
+            .then(showSearchResults)
+            .catch(err => {
+                if (err.name !== "AbortError") console.error(err);
+            });
+    }, SEARCH_DEBOUNCE_MS);
 });
 
 function showSearchResults(list) {
@@ -142,6 +225,7 @@ checkoutBtn.addEventListener("click", () => {
                 cart = {};
                 renderCart();
                 loadHistory();
+                syncCatalog();   // pull the new stock levels
             } else {
                 alert("Error: " + res.error);
             }
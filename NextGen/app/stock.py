@@ -0,0 +1,259 @@
+# NextGen/app/stock.py
+# Stock ledger — every change to on-hand stock is an appended row in
+# stock_movements (product, delta, reason, ref); nothing updates the hot
+# products row on the sale path.
+#
+#   current stock = products.stock_qty            (snapshot)
+#                 + SUM(delta) of movements newer than the snapshot
+#
+# The product_stock view (migration 8) computes exactly that. The
+# compact_stock job folds new movements into products.stock_qty every
+# STOCK_COMPACT_INTERVAL seconds, so pages that read stock_qty directly
+# (dashboards, search, catalogue sync) lag by at most that interval.
+# Checkout always validates against product_stock, under a per-product
+# lock (lock_stock), so the check is exact.
+
+import psycopg2.extras
+from app.config import Config
+from app.kpi import invalidate_kpis
+from app.scheduler import register_job
+
+# advisory lock namespace (first key of pg_advisory_xact_lock(int, int))
+STOCK_LOCK_NS = 4157
+
+# how long the compactor may queue for its table lock (see compact_stock)
+COMPACT_LOCK_TIMEOUT = "100ms"
+
+# Ledger-exact stock of products row `p`, for queries that touch a few
+# rows (a page, a batch of ids); costs one index probe per row, unlike
+# the product_stock view, which aggregates every product.
+LIVE_STOCK_SQL = """
+    (COALESCE(p.stock_qty, 0) + COALESCE((
+        SELECT SUM(m.delta)
+        FROM stock_movements m
+        WHERE m.product_id = p.id
+          AND m.id > (SELECT last_movement_id FROM stock_snapshot_state)
+    ), 0))
+"""
+
+
+def record_movements(cur, movements, purchase_order_id=None):
+    """Append (product_id, delta, reason, ref) rows in one statement."""
+    if not movements:
+        return
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO stock_movements (product_id, delta, reason, ref, purchase_order_id)
+        VALUES %s;
+    """, [m + (purchase_order_id,) for m in movements], page_size=len(movements))
+
+
+def current_stock(cur, product_ids):
+    """{product_id: stock} for the given ids; unknown products are absent."""
+    cur.execute("""
+        SELECT product_id, stock_qty
+        FROM product_stock
+        WHERE product_id = ANY(%s);
+    """, (list(product_ids),))
+    return {r["product_id"]: r["stock_qty"] for r in cur.fetchall()}
+
+
+def live_stock(cur, product_ids):
+    """{product_id: stock} for a few ids (a page, search results), one index probe each."""
+    cur.execute(f"""
+        SELECT p.id, {LIVE_STOCK_SQL} AS stock_qty
+        FROM products p
+        WHERE p.id = ANY(%s);
+    """, (list(product_ids),))
+    return {r["id"]: r["stock_qty"] for r in cur.fetchall()}
+
+
+def lock_stock(cur, product_ids):
+    """
+    Serialise stock decisions on these products until commit. Taken in
+    id order, like row locks, so two tills can't deadlock. Advisory, so
+    readers and the compactor's UPDATE never wait on it.
+    """
+    ids = sorted(product_ids)
+    if ids:
+        cur.execute(
+            "SELECT pg_advisory_xact_lock(%s, id) FROM unnest(%s::int[]) AS id;",
+            (STOCK_LOCK_NS, ids)
+        )
+
+
+def reserve_stock(cur, need):
+    """
+    Lock the products of {product_id: qty} until commit and return their
+    stock (missing ids = unknown products). Read after the lock, so no
+    other checkout can sell the same units before this one commits.
+    """
+    lock_stock(cur, need)
+    return current_stock(cur, need)
+
+
+def foreign_batches(cur, pairs):
+    """
+    (batch_id, product_id) pairs whose batch doesn't exist or is linked
+    to another product. Unlinked batches (product_id NULL) pass.
+    """
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return []
+    rows = psycopg2.extras.execute_values(cur, """
+        SELECT v.batch_id, v.product_id
+        FROM (VALUES %s) AS v(batch_id, product_id)
+        LEFT JOIN batches b ON b.id = v.batch_id
+        WHERE b.id IS NULL
+           OR b.product_id <> v.product_id
+        ORDER BY v.batch_id, v.product_id
+    """, pairs, page_size=len(pairs), fetch=True)
+    return [(r["batch_id"], r["product_id"]) for r in rows]
+
+
+def describe_batches(pairs, limit=20):
+    text = ", ".join(f"batch {b} (product {p})" for b, p in pairs[:limit])
+    return text + (f" and {len(pairs) - limit} more" if len(pairs) > limit else "")
+
+
+class ReceiptError(Exception):
+    """A goods receipt references unknown products, or batches that aren't theirs."""
+
+
+def receive_goods(cur, lines, ref=None, purchase_order_id=None):
+    """
+    Book a delivery: `lines` are dicts (product_id, qty, expiry_date,
+    batch_id). Set-based whatever the line count — one ledger INSERT,
+    one products UPDATE for expiries, one batches UPDATE. A batch must
+    belong to its line's product (batches.product_id, migration 15); a
+    batch not linked to any product yet is linked to the product of its
+    first receipt. With `purchase_order_id` the delivery is booked
+    against that (open) purchase order; the auto-order engine closes its
+    lines once their quantity has arrived. Raises ReceiptError; the
+    caller owns the transaction.
+    """
+    if purchase_order_id is not None:
+        cur.execute("SELECT status FROM purchase_orders WHERE id = %s;", (purchase_order_id,))
+        po = cur.fetchone()
+        if po is None or po["status"] != "Open":
+            raise ReceiptError(f"Purchase order {purchase_order_id} is not open")
+
+    product_ids = {ln["product_id"] for ln in lines}
+    cur.execute("SELECT id FROM products WHERE id = ANY(%s);", (sorted(product_ids),))
+    missing = product_ids - {r["id"] for r in cur.fetchall()}
+    if missing:
+        raise ReceiptError(f"Unknown products: {', '.join(map(str, sorted(missing)))}")
+
+    pairs = sorted({(ln["batch_id"], ln["product_id"]) for ln in lines if ln.get("batch_id") is not None})
+    owners = {}
+    for bid, pid in pairs:
+        owners.setdefault(bid, set()).add(pid)
+    split = [(bid, pid) for bid, pid in pairs if len(owners[bid]) > 1]
+    if split:
+        raise ReceiptError(f"Batch received under several products: {describe_batches(split)}")
+
+    bad = foreign_batches(cur, pairs)
+    if bad:
+        raise ReceiptError(f"Batches unknown or not of the line's product: {describe_batches(bad)}")
+
+    # Ledger first: the compactor locks stock_movements before products rows
+    qty = {}
+    for ln in lines:
+        qty[ln["product_id"]] = qty.get(ln["product_id"], 0) + ln["qty"]
+    record_movements(cur, [(pid, q, "receipt", ref) for pid, q in qty.items()], purchase_order_id)
+
+    # Earliest expiry in the delivery wins for each product
+    expiry = {}
+    for ln in lines:
+        if ln.get("expiry_date"):
+            pid = ln["product_id"]
+            expiry[pid] = min(expiry.get(pid, ln["expiry_date"]), ln["expiry_date"])
+    if expiry:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE products p
+            SET expiry_date = v.expiry_date
+            FROM (VALUES %s) AS v(id, expiry_date)
+            WHERE p.id = v.id
+        """, sorted(expiry.items()), template="(%s, %s::date)", page_size=len(expiry))
+
+    batch_qty = {}
+    for ln in lines:
+        if ln.get("batch_id") is not None:
+            batch_qty[ln["batch_id"]] = batch_qty.get(ln["batch_id"], 0) + ln["qty"]
+    if batch_qty:
+        # links unlinked batches to this product; the owner guard catches a
+        # concurrent receipt that linked the batch elsewhere since the check
+        psycopg2.extras.execute_values(cur, """
+            UPDATE batches b
+            SET batch_qty = COALESCE(b.batch_qty, 0) + v.qty,
+                product_id = v.product_id
+            FROM (VALUES %s) AS v(id, qty, product_id)
+            WHERE b.id = v.id
+              AND (b.product_id IS NULL OR b.product_id = v.product_id)
+        """, [(bid, q, next(iter(owners[bid]))) for bid, q in sorted(batch_qty.items())],
+            page_size=len(batch_qty))
+        if cur.rowcount != len(batch_qty):
+            raise ReceiptError("A batch in this receipt was linked to another product meanwhile")
+
+    return {"lines": len(lines), "products": len(qty), "units": sum(qty.values())}
+
+
+# ----------------------------
+# Compaction
+# ----------------------------
+def compact_stock(conn):
+    """
+    Fold every committed movement newer than the snapshot into
+    products.stock_qty. Returns the number of products touched.
+
+    SHARE mode waits for open ledger writers to commit, so no movement
+    with a lower id can appear behind the new watermark. While the lock
+    is queued or held, new ledger writers (checkout, receipts) wait: at
+    most COMPACT_LOCK_TIMEOUT if an open writer keeps us from getting it
+    (we give up and retry next run), plus the few ms the fold takes.
+    benchmarks/checkout_contention.py --compact measures that stall.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT set_config('lock_timeout', %s, true);", (COMPACT_LOCK_TIMEOUT,))
+    cur.execute("LOCK TABLE stock_movements IN SHARE MODE;")
+
+    cur.execute("""
+        SELECT last_movement_id, (SELECT MAX(id) FROM stock_movements) AS max_id
+        FROM stock_snapshot_state
+        FOR UPDATE;
+    """)
+    row = cur.fetchone()
+    last_id, max_id = row["last_movement_id"], row["max_id"]
+
+    if max_id is None or max_id <= last_id:
+        cur.close()
+        return 0
+
+    cur.execute("""
+        UPDATE products p
+        SET stock_qty = COALESCE(p.stock_qty, 0) + d.delta
+        FROM (
+            SELECT product_id, SUM(delta) AS delta
+            FROM stock_movements
+            WHERE id > %s AND id <= %s
+            GROUP BY product_id
+        ) d
+        WHERE p.id = d.product_id
+          AND d.delta <> 0;
+    """, (last_id, max_id))
+    touched = cur.rowcount
+
+    cur.execute("""
+        UPDATE stock_snapshot_state
+        SET last_movement_id = %s, compacted_at = NOW();
+    """, (max_id,))
+
+    # not the search index: its postings don't depend on stock, and the
+    # typeahead reads stock per result (live_stock)
+    if touched:
+        invalidate_kpis(conn)
+
+    cur.close()
+    return touched
+
+
+register_job("compact_stock", Config.STOCK_COMPACT_INTERVAL, compact_stock)
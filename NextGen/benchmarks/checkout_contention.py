@@ -0,0 +1,301 @@
+# NextGen/benchmarks/checkout_contention.py
+# Checkout throughput under lock contention: N concurrent cashiers, each
+# on its own connection, billing carts whose products follow a Zipf
+# popularity curve (a few SKUs are in most carts, as at a real counter).
+#
+# Unlike checkout_latency this COMMITS — contention only exists between
+# committed-or-waiting transactions. Everything it writes (LOADTEST-*
+# products, their sales/bills, the 1970-01-01 bill counter) is deleted
+# at the end. Point it at a local database, not production.
+#
+#   cd NextGen && python -m benchmarks.checkout_contention \
+#       [--cashiers 1,4,16,32] [--seconds 10] [--products 500] [--zipf 1.1]
+#       [--compact 10]
+#
+# --compact N also runs the stock compactor every N seconds, as the
+# scheduler does, and reports how long each fold held the ledger lock and
+# how often it gave up; checkout stalls behind it show up as "relation"
+# lock waits and in p99.
+
+import argparse
+import bisect
+import random
+import statistics
+import threading
+import time
+from datetime import date
+import psycopg2
+import psycopg2.errorcodes
+import psycopg2.errors
+import psycopg2.extras
+from app.db import connect
+from app.billing import CheckoutError, record_sale
+from app.stock import compact_stock
+
+BILL_DATE = date(1970, 1, 1)        # sentinel counter row, never a real day
+MAX_LINES = 50
+MAX_RETRIES = 3
+SAMPLE_INTERVAL = 0.01              # pg_stat_activity poll period (s)
+
+ISOLATION = {
+    "read-committed": psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED,
+    "repeatable-read": psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+    "serializable": psycopg2.extensions.ISOLATION_LEVEL_SERIALIZABLE,
+}
+
+
+# ----------------------------
+# Workload
+# ----------------------------
+class Workload:
+    """Cart generator: Zipf(s) product popularity, long-tailed cart sizes."""
+
+    def __init__(self, product_ids, zipf_s, mean_lines):
+        self.product_ids = product_ids
+        self.mean_lines = mean_lines
+        weights = [1 / (rank ** zipf_s) for rank in range(1, len(product_ids) + 1)]
+        total = 0.0
+        self.cum_weights = []
+        for w in weights:
+            total += w
+            self.cum_weights.append(total)
+
+    def _pick(self, rng):
+        i = bisect.bisect_left(self.cum_weights, rng.random() * self.cum_weights[-1])
+        return self.product_ids[min(i, len(self.product_ids) - 1)]
+
+    def cart(self, rng):
+        # 1 + exponential: mostly small baskets, the odd trolley
+        lines = min(MAX_LINES, 1 + int(rng.expovariate(1 / max(self.mean_lines - 1, 0.1))))
+        chosen = {}
+        for _ in range(lines):
+            pid = self._pick(rng)
+            chosen[pid] = chosen.get(pid, 0) + rng.randint(1, 3)
+        return [
+            {"product_id": pid, "qty": qty, "unit_price": 10.0, "batch_id": None}
+            for pid, qty in chosen.items()
+        ]
+
+
+# ----------------------------
+# Cashiers
+# ----------------------------
+class Stats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []           # ms, successful checkouts incl. retries
+        self.deadlocks = 0
+        self.serialization = 0
+        self.other_errors = 0
+        self.gave_up = 0
+
+
+def _cashier(conn, workload, seed, deadline, stats):
+    rng = random.Random(seed)
+    cur = conn.cursor()
+
+    while time.monotonic() < deadline:
+        items = workload.cart(rng)
+        start = time.perf_counter()
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                record_sale(cur, items, 1, BILL_DATE)
+                conn.commit()
+                with stats.lock:
+                    stats.latencies.append((time.perf_counter() - start) * 1000)
+                break
+
+            except psycopg2.Error as e:
+                conn.rollback()
+                with stats.lock:
+                    if e.pgcode == psycopg2.errorcodes.DEADLOCK_DETECTED:
+                        stats.deadlocks += 1
+                    elif e.pgcode == psycopg2.errorcodes.SERIALIZATION_FAILURE:
+                        stats.serialization += 1
+                    else:
+                        stats.other_errors += 1
+                        break
+                    if attempt == MAX_RETRIES:
+                        stats.gave_up += 1
+
+            except CheckoutError:
+                conn.rollback()
+                with stats.lock:
+                    stats.other_errors += 1
+                break
+
+    cur.close()
+
+
+def _sample_lock_waits(pids, stop, waits):
+    """Poll pg_stat_activity; every sample a cashier spends on a Lock wait adds SAMPLE_INTERVAL."""
+    conn = connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        while not stop.is_set():
+            cur.execute("""
+                SELECT wait_event, COUNT(*) AS n
+                FROM pg_stat_activity
+                WHERE pid = ANY(%s) AND wait_event_type = 'Lock'
+                GROUP BY wait_event;
+            """, (pids,))
+            for r in cur.fetchall():
+                waits[r["wait_event"]] = waits.get(r["wait_event"], 0.0) + r["n"] * SAMPLE_INTERVAL
+            time.sleep(SAMPLE_INTERVAL)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _compactor(every, stop, runs):
+    """Run compact_stock every `every` seconds; records (ms, ok) per run."""
+    conn = connect()
+    try:
+        while not stop.wait(every):
+            start = time.perf_counter()
+            try:
+                compact_stock(conn)
+                conn.commit()
+                ok = True
+            except psycopg2.errors.LockNotAvailable:
+                conn.rollback()
+                ok = False
+            runs.append(((time.perf_counter() - start) * 1000, ok))
+    finally:
+        conn.close()
+
+
+def run_level(cashiers, workload, seconds, isolation, compact_every=None):
+    conns = []
+    for _ in range(cashiers):
+        c = connect()
+        c.set_isolation_level(ISOLATION[isolation])
+        conns.append(c)
+
+    pids = [c.get_backend_pid() for c in conns]
+    stats = Stats()
+    waits = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_lock_waits, args=(pids, stop, waits), daemon=True)
+    compactions = []
+    compactor = None
+    if compact_every:
+        compactor = threading.Thread(target=_compactor, args=(compact_every, stop, compactions), daemon=True)
+
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=_cashier, args=(c, workload, i, deadline, stats), daemon=True)
+        for i, c in enumerate(conns)
+    ]
+
+    sampler.start()
+    if compactor:
+        compactor.start()
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+    sampler.join()
+    if compactor:
+        compactor.join()
+
+    for c in conns:
+        c.close()
+
+    lat = sorted(stats.latencies)
+    return {
+        "cashiers": cashiers,
+        "checkouts": len(lat),
+        "per_sec": len(lat) / elapsed,
+        "p50": statistics.median(lat) if lat else 0.0,
+        "p99": lat[int(0.99 * (len(lat) - 1))] if lat else 0.0,
+        "lock_wait_s": sum(waits.values()),
+        "lock_wait_share": sum(waits.values()) / (cashiers * elapsed),
+        "waits": waits,
+        "deadlocks": stats.deadlocks,
+        "serialization": stats.serialization,
+        "gave_up": stats.gave_up,
+        "errors": stats.other_errors,
+        "compactions": compactions,
+    }
+
+
+# ----------------------------
+# Setup / teardown
+# ----------------------------
+def _make_products(conn, n):
+    cur = conn.cursor()
+    rows = psycopg2.extras.execute_values(cur, """
+        INSERT INTO products (name, category, stock_qty, selling_price)
+        VALUES %s
+        RETURNING id;
+    """, [(f"LOADTEST-{i}", "Benchmark", 1_000_000_000, 10.0) for i in range(n)],
+        page_size=n, fetch=True)
+    conn.commit()
+    cur.close()
+    return [r["id"] for r in rows]
+
+
+def _cleanup(conn, product_ids):
+    cur = conn.cursor()
+    bills = f"BILL-{BILL_DATE:%Y%m%d}-%"
+    cur.execute("DELETE FROM sales WHERE bill_no LIKE %s;", (bills,))
+    cur.execute("DELETE FROM bills WHERE bill_no LIKE %s;", (bills,))
+    cur.execute("DELETE FROM bill_counters WHERE bill_date = %s;", (BILL_DATE,))
+    cur.execute("DELETE FROM sales_daily WHERE product_id = ANY(%s);", (product_ids,))
+    cur.execute("DELETE FROM stock_movements WHERE product_id = ANY(%s);", (product_ids,))
+    cur.execute("DELETE FROM products WHERE id = ANY(%s);", (product_ids,))
+    cur.execute("DELETE FROM product_tombstones WHERE product_id = ANY(%s);", (product_ids,))
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkout lock-contention load test")
+    parser.add_argument("--cashiers", default="1,4,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew (0 = uniform)")
+    parser.add_argument("--mean-lines", type=float, default=6)
+    parser.add_argument("--isolation", choices=sorted(ISOLATION), default="read-committed")
+    parser.add_argument("--compact", type=float, default=None, metavar="SECONDS",
+                        help="also run the stock compactor at this period")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.cashiers.split(",")]
+
+    conn = connect()
+    product_ids = _make_products(conn, args.products)
+    try:
+        workload = Workload(product_ids, args.zipf, args.mean_lines)
+
+        print(f"{args.products} products, zipf s={args.zipf}, "
+              f"mean {args.mean_lines} lines/cart, {args.isolation}, {args.seconds:.0f}s per level")
+        print(f"{'cashiers':>8} | {'chk/s':>8} | {'p50 ms':>8} | {'p99 ms':>8} | "
+              f"{'lock wait':>9} | {'deadlock':>8} | {'serial':>6} | {'gave up':>7} | {'errors':>6}")
+        print("-" * 90)
+        for n in levels:
+            r = run_level(n, workload, args.seconds, args.isolation, args.compact)
+            print(f"{r['cashiers']:>8} | {r['per_sec']:>8.1f} | {r['p50']:>8.2f} | {r['p99']:>8.2f} | "
+                  f"{r['lock_wait_share']:>8.0%} | {r['deadlocks']:>8} | {r['serialization']:>6} | "
+                  f"{r['gave_up']:>7} | {r['errors']:>6}")
+            if r["waits"]:
+                detail = ", ".join(f"{k} {v:.1f}s" for k, v in sorted(r["waits"].items(), key=lambda kv: -kv[1]))
+                print(f"{'':>8}   lock waits by type: {detail}")
+            if r["compactions"]:
+                done = [ms for ms, ok in r["compactions"] if ok]
+                print(f"{'':>8}   compactor: {len(done)} folds, max {max(done, default=0):.1f} ms, "
+                      f"{len(r['compactions']) - len(done)} lock timeouts")
+    finally:
+        _cleanup(conn, product_ids)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
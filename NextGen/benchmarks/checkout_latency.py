@@ -0,0 +1,117 @@
+# NextGen/benchmarks/checkout_latency.py
+# Checkout latency at 1 / 20 / 100 cart lines: set-based record_sale()
+# vs the old one-query-per-line loop. Runs against the configured
+# database inside a transaction that is always rolled back.
+#
+#   cd NextGen && python -m benchmarks.checkout_latency [--runs 30]
+
+import argparse
+import statistics
+import time
+import psycopg2.extras
+from app.db import connect
+from app.billing import next_bill_no, record_sale
+
+SIZES = (1, 20, 100)
+
+
+class CountingCursor(psycopg2.extras.RealDictCursor):
+    """Counts statements sent to the server (one round trip each)."""
+    statements = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.statements += 1
+        return super().execute(query, vars)
+
+
+def legacy_record_sale(cur, items, biller_id):
+    """The pre-set-based checkout: lock, insert and update one line at a time."""
+    for it in items:
+        cur.execute("SELECT stock_qty FROM products WHERE id=%s FOR UPDATE", (it["product_id"],))
+        row = cur.fetchone()
+        if not row or it["qty"] > (row["stock_qty"] or 0):
+            raise Exception(f"Insufficient stock for product {it['product_id']}")
+
+    bill_no = next_bill_no(cur)
+
+    # header row required by fk_sales_bill_no (not part of the old flow's cost)
+    cur.execute("""
+        INSERT INTO bills (bill_no, biller_id, item_count, net_amount)
+        VALUES (%s, %s, %s, 0);
+    """, (bill_no, biller_id, len(items)))
+
+    sale_ids = []
+    for it in items:
+        cur.execute("""
+            INSERT INTO sales
+                (product_id, batch_id, qty_sold, sale_date, total_amount, biller_id, bill_no)
+            VALUES
+                (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s)
+            RETURNING id;
+        """, (it["product_id"], None, it["qty"], it["qty"] * it["unit_price"], biller_id, bill_no))
+        sale_ids.append(cur.fetchone()["id"])
+        cur.execute("UPDATE products SET stock_qty = stock_qty - %s WHERE id = %s",
+                    (it["qty"], it["product_id"]))
+    return bill_no, sale_ids
+
+
+def _make_products(cur, n):
+    rows = psycopg2.extras.execute_values(cur, """
+        INSERT INTO products (name, category, stock_qty, selling_price)
+        VALUES %s
+        RETURNING id;
+    """, [(f"BENCH-{i}", "Benchmark", 1_000_000, 10.0) for i in range(n)],
+        page_size=n, fetch=True)
+    return [r["id"] for r in rows]
+
+
+def _measure(conn, fn, items, runs):
+    cur = conn.cursor()
+    timings = []
+    CountingCursor.statements = 0
+    for _ in range(runs):
+        cur.execute("SAVEPOINT bench;")
+        start = time.perf_counter()
+        fn(cur, items, 1)
+        timings.append((time.perf_counter() - start) * 1000)
+        cur.execute("ROLLBACK TO SAVEPOINT bench;")
+    # two SAVEPOINT statements per run are bookkeeping, not checkout
+    per_run = CountingCursor.statements / runs - 2
+    cur.close()
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[int(0.95 * (len(timings) - 1))],
+        "round_trips": per_run,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkout latency benchmark")
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    conn = connect()
+    conn.cursor_factory = CountingCursor
+    try:
+        cur = conn.cursor()
+        product_ids = _make_products(cur, max(SIZES))
+        cur.close()
+
+        print(f"{'lines':>5} | {'impl':<10} | {'p50 ms':>8} | {'p95 ms':>8} | {'round trips':>11}")
+        print("-" * 55)
+        for n in SIZES:
+            items = [
+                {"product_id": pid, "qty": 1, "unit_price": 10.0, "batch_id": None}
+                for pid in product_ids[:n]
+            ]
+            for name, fn in (("set-based", record_sale), ("per-line", legacy_record_sale)):
+                r = _measure(conn, fn, items, args.runs)
+                print(f"{n:>5} | {name:<10} | {r['p50']:>8.2f} | {r['p95']:>8.2f} | {r['round_trips']:>11.0f}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# NextGen/tests/test_receive_goods.py
+# stock.receive_goods() batch handling, against the configured database.
+# Every test runs in a transaction that is rolled back.
+#
+#   cd NextGen && python -m pytest tests
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from app.db import connect
+from app.stock import ReceiptError, receive_goods
+
+
+@pytest.fixture
+def cur():
+    try:
+        conn = connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database unavailable: {e}")
+    cur = conn.cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.close()
+
+
+def _product(cur, name):
+    cur.execute("""
+        INSERT INTO products (name, category, stock_qty, selling_price)
+        VALUES (%s, 'Test', 0, 1.0)
+        RETURNING id;
+    """, (name,))
+    return cur.fetchone()["id"]
+
+
+def _batch(cur, product_id=None):
+    cur.execute(
+        "INSERT INTO batches (batch_qty, product_id) VALUES (0, %s) RETURNING id;",
+        (product_id,)
+    )
+    return cur.fetchone()["id"]
+
+
+def _batch_row(cur, batch_id):
+    cur.execute("SELECT batch_qty, product_id FROM batches WHERE id = %s;", (batch_id,))
+    return cur.fetchone()
+
+
+def test_receipt_into_fresh_batch_links_it(cur):
+    pid = _product(cur, "TEST-fresh-batch")
+    bid = _batch(cur)
+
+    receive_goods(cur, [{"product_id": pid, "qty": 12, "expiry_date": None, "batch_id": bid}], ref="T-1")
+
+    row = _batch_row(cur, bid)
+    assert row["batch_qty"] == 12
+    assert row["product_id"] == pid
+
+    # linked now: a second receipt for the same product tops it up again
+    receive_goods(cur, [{"product_id": pid, "qty": 3, "expiry_date": None, "batch_id": bid}], ref="T-2")
+    assert _batch_row(cur, bid)["batch_qty"] == 15
+
+
+def test_receipt_into_another_products_batch_is_rejected(cur):
+    owner = _product(cur, "TEST-owner")
+    other = _product(cur, "TEST-other")
+    bid = _batch(cur, owner)
+
+    with pytest.raises(ReceiptError, match=f"batch {bid}"):
+        receive_goods(cur, [{"product_id": other, "qty": 5, "expiry_date": None, "batch_id": bid}])
+
+    assert _batch_row(cur, bid)["batch_qty"] == 0
+
+
+def test_one_batch_under_two_products_is_rejected(cur):
+    a = _product(cur, "TEST-a")
+    b = _product(cur, "TEST-b")
+    bid = _batch(cur)
+
+    with pytest.raises(ReceiptError, match="several products"):
+        receive_goods(cur, [
+            {"product_id": a, "qty": 1, "expiry_date": None, "batch_id": bid},
+            {"product_id": b, "qty": 1, "expiry_date": None, "batch_id": bid},
+        ])
+
+    assert _batch_row(cur, bid)["product_id"] is None